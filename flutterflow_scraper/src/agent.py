@@ -1,5 +1,9 @@
+import asyncio
 import os
-from typing import List, Dict, Any
+import re
+from collections import OrderedDict
+import httpx
+from typing import AsyncIterator, List, Dict, Any, Optional
 from dotenv import load_dotenv
 from langchain_community.vectorstores.supabase import SupabaseVectorStore
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
@@ -7,13 +11,51 @@ from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from supabase import create_client, Client
-from tools import create_tools
+from tools import create_tools, retrieve_documentation
+from embedding_config import EMBEDDING_MODEL, get_embedding_dimensions
+
+# Questions that usually need more than one lookup are left to the tool-using agent
+AGENT_ROUTE_PATTERN = re.compile(
+    r"\b(compare|comparison|difference between|differences between|versus|vs\.?|step[- ]by[- ]step plan)\b",
+    re.IGNORECASE,
+)
+
+ANSWER_SYSTEM_PROMPT = """You are a helpful FlutterFlow expert assistant that helps users with their FlutterFlow questions and issues.
+
+Answer using the documentation excerpts provided with the question. They contain both an overview
+(titles and summaries) and detailed content from the official documentation.
+
+When answering:
+1. Structure your response clearly:
+   - Start with a high-level overview from documentation
+   - Follow with detailed technical information
+   - Always include relevant documentation URLs
+   - Use code examples when available
+
+2. Make information actionable:
+   - Break down complex topics into steps
+   - Highlight important considerations
+   - Explain any prerequisites
+
+If the excerpts do not answer the question:
+1. Clearly state that no relevant documentation was found
+2. Suggest rephrasing the question
+3. Direct the user to the FlutterFlow documentation: https://docs.flutterflow.io
+
+Remember: Focus on providing accurate, well-structured information from the official documentation."""
 
 class FlutterFlowAgent:
-    def __init__(self):
+    def __init__(self, mode: Optional[str] = None):
         # Load environment variables
         load_dotenv()
         
+        # "fast" retrieves eagerly and answers in a single LLM call, falling back to the
+        # agent when the router or retrieval scores call for it; "agent" always uses the agent
+        self.mode = (mode or os.getenv("AGENT_MODE", "fast")).lower()
+        if self.mode not in ("fast", "agent"):
+            raise ValueError(f"Unknown agent mode: {self.mode} (expected 'fast' or 'agent')")
+        self.fast_path_min_score = float(os.getenv("FAST_PATH_MIN_SCORE", "0.75"))
+        
         # Initialize Supabase client
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_KEY")
@@ -27,11 +69,26 @@ class FlutterFlowAgent:
         if not openai_api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
+        # Shared keep-alive connection pools to the LLM endpoint, used by both the
+        # embeddings and the LLM. The async pool stays usable as long as the agent
+        # is always awaited on the same event loop.
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10")),
+            keepalive_expiry=60.0
+        )
+        timeout = httpx.Timeout(600.0, connect=5.0)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        
         # Initialize embeddings
         self.embeddings = OpenAIEmbeddings(
             api_key=openai_api_key,
             base_url="https://litellm.deriv.ai/v1",
-            model="text-embedding-3-small"
+            model=EMBEDDING_MODEL,
+            dimensions=get_embedding_dimensions(),
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
         )
         
         # Initialize LLM
@@ -39,7 +96,9 @@ class FlutterFlowAgent:
             api_key=openai_api_key,
             base_url="https://litellm.deriv.ai/v1",
             model="gpt-4o",
-            temperature=0.3
+            temperature=0.3,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
         )
         
         # Initialize vector store
@@ -53,12 +112,25 @@ class FlutterFlowAgent:
         # Initialize conversation memory
         self.memory = ConversationBufferMemory(
             memory_key="chat_history",
-            return_messages=True
+            return_messages=True,
+            # Only the question is remembered, not the retrieved context passed with it
+            input_key="input"
         )
         
+        # Per-session conversation memory, least recently used first
+        self.sessions: OrderedDict[str, ConversationBufferMemory] = OrderedDict()
+        self.max_sessions = int(os.getenv("MAX_SESSIONS", "1000"))
+        
         # Create tools
         self.tools = create_tools(self.vector_store, self.supabase)
         
+        # Prompt for the single-call fast path
+        self.answer_prompt = ChatPromptTemplate.from_messages([
+            ("system", ANSWER_SYSTEM_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "Documentation:\n{context}\n\nQuestion: {input}"),
+        ])
+        
         # Create the prompt template
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a helpful FlutterFlow expert assistant that helps users with their FlutterFlow questions and issues.
@@ -86,39 +158,207 @@ class FlutterFlowAgent:
             
             Remember: Focus on providing accurate, well-structured information from the official documentation."""),
             MessagesPlaceholder(variable_name="chat_history"),
+            ("system", "{retrieved_context}"),
             ("human", "{input}"),
             ("system", "{agent_scratchpad}"),
         ])
         
         # Create the agent
-        agent = create_openai_functions_agent(self.llm, self.tools, prompt)
+        self.agent = create_openai_functions_agent(self.llm, self.tools, prompt)
         
         # Create the agent executor
         self.agent_executor = AgentExecutor(
-            agent=agent,
+            agent=self.agent,
             tools=self.tools,
             memory=self.memory,
             verbose=True
         )
 
-    async def query(self, question: str) -> dict:
+    async def warmup(self) -> None:
+        """
+        Open connections to the LLM endpoint and Supabase ahead of the first question
+        
+        Makes one small embedding request and one Supabase query so their TLS
+        handshakes happen at startup rather than on a user's first query.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(
+                self.embeddings.aembed_query("FlutterFlow"),
+                loop.run_in_executor(
+                    None, lambda: self.supabase.table("documents").select("id").limit(1).execute()
+                ),
+            )
+            print("Agent warmed up")
+        except Exception as e:
+            print(f"Error warming up agent: {str(e)}")
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP clients"""
+        await self.http_async_client.aclose()
+        self.http_client.close()
+
+    def get_memory(self, session_id: Optional[str] = None) -> ConversationBufferMemory:
+        """Return the conversation memory for a session, or the default memory"""
+        if session_id is None:
+            return self.memory
+        
+        memory = self.sessions.get(session_id)
+        if memory is None:
+            memory = ConversationBufferMemory(
+                memory_key="chat_history",
+                return_messages=True,
+                input_key="input"
+            )
+            self.sessions[session_id] = memory
+            # Forget the least recently used session when over the limit
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        return memory
+
+    def get_executor(self, session_id: Optional[str] = None) -> AgentExecutor:
+        """Return an agent executor using the session's conversation memory"""
+        if session_id is None:
+            return self.agent_executor
+        return AgentExecutor(
+            agent=self.agent,
+            tools=self.tools,
+            memory=self.get_memory(session_id),
+            verbose=True
+        )
+
+    def needs_agent(self, question: str) -> bool:
+        """
+        Lightweight router deciding whether a question should skip the fast path
+        
+        Multi-part and comparison questions usually need several searches, which
+        only the tool-using agent can do.
+        """
+        if self.mode == "agent":
+            return True
+        if question.count("?") > 1:
+            return True
+        return bool(AGENT_ROUTE_PATTERN.search(question))
+
+    async def retrieve(self, question: str) -> tuple[str, List[str], float]:
+        """
+        Retrieve documentation for a question up front
+        
+        Returns:
+            tuple: (context, sources, best similarity score). Empty when the router
+            sends the question straight to the agent or retrieval failed.
+        """
+        if self.needs_agent(question):
+            return "", [], 0.0
+        
+        try:
+            # The Supabase client is synchronous, so keep it off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, retrieve_documentation, self.vector_store, self.supabase, question
+            )
+        except Exception as e:
+            print(f"Error retrieving documentation, falling back to agent: {str(e)}")
+            return "", [], 0.0
+
+    def is_answerable(self, context: str, score: float) -> bool:
+        """Whether retrieved context is good enough to answer from without the agent"""
+        return bool(context) and score >= self.fast_path_min_score
+
+    async def run_agent(self, question: str, context: str = "", session_id: Optional[str] = None) -> str:
+        """
+        Answer with the tool-using agent
+        
+        Documentation already retrieved for the question is passed along, so the
+        agent only searches again for what it does not cover.
+        """
+        if context:
+            retrieved_context = (
+                "Documentation already retrieved for this question. Use it, and only search "
+                f"again for what it does not cover:\n{context}"
+            )
+        else:
+            retrieved_context = "No documentation has been retrieved for this question yet."
+        
+        response = await self.get_executor(session_id).ainvoke({
+            "input": question,
+            "retrieved_context": retrieved_context
+        })
+        return response["output"]
+
+    async def stream_answer(self, question: str, context: str, session_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Answer from retrieved context in a single streamed LLM call"""
+        memory = self.get_memory(session_id)
+        chat_history = memory.load_memory_variables({})["chat_history"]
+        messages = self.answer_prompt.format_messages(
+            context=context,
+            input=question,
+            chat_history=chat_history,
+        )
+        
+        chunks = []
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+        
+        # Keep the conversation memory shared with the agent path
+        memory.save_context({"input": question}, {"output": "".join(chunks)})
+
+    async def stream_query(self, question: str, session_id: Optional[str] = None) -> AsyncIterator[dict]:
+        """
+        Stream the answer to a FlutterFlow question
+        
+        Args:
+            question: The question to ask about FlutterFlow
+            session_id: Conversation to continue, or None for the default conversation
+            
+        Yields:
+            dict: {"type": "chunk", "text": ...} events with the answer text, then one
+                {"type": "sources", "sources": [...]} event. The agent fallback
+                yields its answer in one chunk.
+        """
+        context, sources, score = await self.retrieve(question)
+        if self.is_answerable(context, score):
+            async for chunk in self.stream_answer(question, context, session_id):
+                yield {"type": "chunk", "text": chunk}
+            yield {"type": "sources", "sources": sources}
+            return
+        
+        answer = await self.run_agent(question, context, session_id)
+        yield {"type": "chunk", "text": answer}
+        # Sources are included in the agent's answer text
+        yield {"type": "sources", "sources": []}
+
+    async def query(self, question: str, session_id: Optional[str] = None) -> dict:
         """
         Query FlutterFlow documentation with a question
         
         Args:
             question: The question to ask about FlutterFlow
+            session_id: Conversation to continue, or None for the default conversation
             
         Returns:
             dict: Contains the answer with relevant documentation information
         """
         try:
-            # Get response from agent
-            response = await self.agent_executor.ainvoke({"input": question})
+            context, sources, score = await self.retrieve(question)
+            if self.is_answerable(context, score):
+                answer = "".join([chunk async for chunk in self.stream_answer(question, context, session_id)])
+                return {
+                    "answer": answer,
+                    "sources": sources
+                }
+            
+            # Get response from agent, reusing what was already retrieved
+            answer = await self.run_agent(question, context, session_id)
             
             # Extract any source information from the response
             # The agent's response might include source information in a structured way
             return {
-                "answer": response["output"],
+                "answer": answer,
                 "sources": []  # Sources are now included in the answer text
             }
             
@@ -130,9 +370,12 @@ class FlutterFlowAgent:
                 "sources": []
             }
 
-    def clear_memory(self):
+    def clear_memory(self, session_id: Optional[str] = None):
         """Clear the conversation memory"""
-        self.memory.clear()
+        if session_id is None:
+            self.memory.clear()
+        else:
+            self.sessions.pop(session_id, None)
 
 async def main():
     # Example usage
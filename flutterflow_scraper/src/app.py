@@ -1,11 +1,21 @@
 import streamlit as st
-import asyncio
 from agent import FlutterFlowAgent
+from event_loop import BackgroundEventLoop
+
+# One event loop for the whole process, so the agent's connection pools survive between questions
+@st.cache_resource
+def get_event_loop():
+    return BackgroundEventLoop()
 
 # Initialize the agent
 @st.cache_resource
 def get_agent():
-    return FlutterFlowAgent()
+    agent = FlutterFlowAgent()
+    get_event_loop().run(agent.warmup())
+    return agent
+
+# Build and warm up the agent when the app starts, not on the first question
+get_agent()
 
 # Create the Streamlit UI
 st.title("FlutterFlow Documentation Assistant")
@@ -31,7 +41,7 @@ if question:
         agent = get_agent()
         
         # Run the query
-        response = asyncio.run(agent.query(question))
+        response = get_event_loop().run(agent.query(question))
         
         # Add to chat history
         st.session_state.chat_history.append({
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+class PageArchive:
+    """
+    Compressed, content-addressed archive of crawled pages
+
+    Each page's extracted HTML, markdown and metadata are gzipped into a blob
+    named after the SHA-256 of its contents, so identical pages share a blob.
+    A SQLite index maps URLs to blobs. When the blobs grow beyond max_bytes,
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 2 * 1024 ** 3):
+        self.root = root
+        self.blob_dir = root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        # Several crawl processes may share one archive, so wait on locks rather than failing
+        self.conn = sqlite3.connect(root / "index.sqlite", timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("""
+                create table if not exists pages (
+                    url text primary key,
+                    digest text not null,
+                    archived_at real not null,
+                    accessed_at real not null
+                )
+            """)
+            self.conn.execute("""
+                create table if not exists blobs (
+                    digest text primary key,
+                    size integer not null
+                )
+            """)
+            self.conn.execute("create index if not exists pages_digest on pages (digest)")
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}.json.gz"
+
+    def put(self, url: str, html: str, markdown: str, metadata: Optional[Dict] = None) -> str:
+        """
+        Archive a crawled page
+
+        Returns:
+            str: Digest of the stored blob
+        """
+        payload = json.dumps(
+            {"html": html or "", "markdown": markdown or "", "metadata": metadata or {}},
+            sort_keys=True,
+            ensure_ascii=False
+        ).encode("utf-8")
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self.blob_path(digest)
+
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(payload))
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "insert or replace into blobs (digest, size) values (?, ?)",
+                (digest, path.stat().st_size)
+            )
+            self.conn.execute(
+                "insert or replace into pages (url, digest, archived_at, accessed_at) values (?, ?, ?, ?)",
+                (url, digest, now, now)
+            )
+
+        self.evict()
+        return digest
+
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        Load an archived page
+
+        Returns:
+            dict: With html, markdown and metadata keys, or None if not archived
+        """
+        row = self.conn.execute("select digest from pages where url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        try:
+            with gzip.open(self.blob_path(row[0]), "rb") as f:
+                record = json.loads(f.read())
+        except OSError:
+            return None
+
+        with self.conn:
+            self.conn.execute("update pages set accessed_at = ? where url = ?", (time.time(), url))
+        return record
+
+    def urls(self) -> Iterator[str]:
+        """Iterate over archived URLs"""
+        for (url,) in self.conn.execute("select url from pages order by url").fetchall():
+            yield url
+
+    def total_size(self) -> int:
+        return self.conn.execute("select coalesce(sum(size), 0) from blobs").fetchone()[0]
+
+    def delete_blob(self, digest: str) -> None:
+        with self.conn:
+            self.conn.execute("delete from pages where digest = ?", (digest,))
+            self.conn.execute("delete from blobs where digest = ?", (digest,))
+        try:
+            self.blob_path(digest).unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """
+        Delete blobs until the archive fits in max_bytes
+
+        Blobs no longer referenced by any URL go first, then the least recently
+        used ones.
+
+        Returns:
+            int: Number of blobs deleted
+        """
+        orphans = self.conn.execute(
+            "select digest from blobs where digest not in (select digest from pages)"
+        ).fetchall()
+        for (digest,) in orphans:
+            self.delete_blob(digest)
+
+        evicted = len(orphans)
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return evicted
+
+        lru = self.conn.execute("""
+            select b.digest, b.size
+            from blobs b join pages p on p.digest = b.digest
+            group by b.digest
+            order by max(p.accessed_at)
+        """).fetchall()
+        for digest, size in lru:
+            if total <= self.max_bytes:
+                break
+            self.delete_blob(digest)
+            total -= size
+            evicted += 1
+        return evicted
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from tqdm import tqdm
+from dedup import SupabaseDedupStore
+from scraper import FlutterFlowScraper
+from work_queue import DONE, FAILED, LEASED, PENDING, SqliteWorkQueue, SupabaseWorkQueue
+
+def open_queue(args: argparse.Namespace, scraper: Optional[FlutterFlowScraper] = None):
+    """Open the shared crawl queue selected on the command line"""
+    if args.queue == "supabase":
+        scraper = scraper or FlutterFlowScraper()
+        return SupabaseWorkQueue(scraper.supabase, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    queue_path = Path(args.queue_path)
+    queue_path.parent.mkdir(parents=True, exist_ok=True)
+    return SqliteWorkQueue(queue_path, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+
+def open_scraper(args: argparse.Namespace) -> FlutterFlowScraper:
+    """Create a scraper sharing boilerplate and near-duplicate state with the other workers"""
+    scraper = FlutterFlowScraper()
+    if args.queue == "supabase":
+        scraper.set_dedup_store(SupabaseDedupStore(scraper.supabase))
+    return scraper
+
+async def heartbeat(queue, worker_id: str, leased: Set[str], interval: float) -> None:
+    """Renew the leases on URLs this worker is still processing"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        if not leased:
+            continue
+        try:
+            await loop.run_in_executor(None, queue.heartbeat, worker_id, list(leased))
+        except Exception as e:
+            print(f"{worker_id}: error renewing leases: {str(e)}")
+
+async def run_worker(args: argparse.Namespace) -> None:
+    """
+    Claim URLs from the shared queue and crawl them until the queue is drained
+
+    Each worker runs its own browser, restarted after max_crawl_failures crawls
+    fail in a row. Leases are renewed in the background, so only URLs held by a
+    worker that died are handed to another worker. Queue errors are retried
+    every poll_interval, up to max_queue_errors times in a row.
+    Boilerplate and near-duplicate state lives next to the queue, so workers
+    learn from each other's pages: in output/dedup.sqlite on one host, or in
+    Supabase (see supabase/dedup_state.sql) across hosts.
+    """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    scraper = open_scraper(args)
+    queue = open_queue(args, scraper)
+    loop = asyncio.get_running_loop()
+
+    leased: Set[str] = set()
+    heartbeat_task = asyncio.create_task(heartbeat(queue, worker_id, leased, args.lease_seconds / 3))
+    crawler = None
+    results: List[Dict] = []
+    crawl_failures = 0
+
+    async def crawl(url: str, pbar: tqdm) -> None:
+        nonlocal crawl_failures
+        doc_data = None
+        error = ""
+        crawled_ok = False
+        try:
+            crawled = await scraper.crawl_page(url, crawler)
+            if crawled is not None and not getattr(crawled[0], "success", True):
+                raise RuntimeError(getattr(crawled[0], "error_message", "") or "crawl failed")
+            crawled_ok = True
+            crawl_failures = 0
+            if crawled is not None:
+                doc_data = await scraper.finish_page(url, *crawled)
+                results.append(doc_data)
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            error = str(e)
+            # Processing errors don't point at the browser, only failed crawls do
+            if not crawled_ok:
+                crawl_failures += 1
+        finally:
+            pbar.update(1)
+
+        try:
+            if doc_data is not None or url in scraper.unchanged_urls:
+                await loop.run_in_executor(None, queue.complete, worker_id, url)
+            else:
+                await loop.run_in_executor(None, queue.fail, worker_id, url, error or "scrape failed")
+        except Exception as e:
+            # Keep the worker running; the lease expires and the URL is claimed again
+            print(f"{worker_id}: error updating queue for {url}: {str(e)}")
+        finally:
+            leased.discard(url)
+
+    async def claim() -> Optional[List[str]]:
+        """Claim URLs; returns None once the queue is drained"""
+        queue_errors = 0
+        while True:
+            try:
+                urls = await loop.run_in_executor(None, queue.claim, worker_id, args.batch_size)
+                if urls:
+                    return urls
+                counts = await loop.run_in_executor(None, queue.counts)
+                # Leases held by other workers may still expire and come back
+                if counts[PENDING] == 0 and counts[LEASED] == 0:
+                    return None
+                queue_errors = 0
+            except Exception as e:
+                queue_errors += 1
+                if queue_errors >= args.max_queue_errors:
+                    raise
+                print(f"{worker_id}: error reading queue, retry {queue_errors}/{args.max_queue_errors}: {str(e)}")
+            await asyncio.sleep(args.poll_interval)
+
+    try:
+        crawler = await scraper.init_crawler_with_retry()
+        with tqdm(desc=f"Worker {worker_id}") as pbar:
+            while True:
+                urls = await claim()
+                if urls is None:
+                    break
+
+                leased.update(urls)
+                await asyncio.gather(*[crawl(url, pbar) for url in urls])
+                scraper.save_progress(results, f"scraped_docs_{worker_id}.json")
+
+                # A browser that died fails every crawl; start a new one before claiming more
+                if crawl_failures >= args.max_crawl_failures:
+                    print(f"{worker_id}: {crawl_failures} crawls failed in a row, restarting the browser")
+                    try:
+                        await crawler.__aexit__(None, None, None)
+                    except Exception as e:
+                        print(f"Error closing crawler: {str(e)}")
+                    crawler = None
+                    crawler = await scraper.init_crawler_with_retry()
+                    crawl_failures = 0
+    finally:
+        heartbeat_task.cancel()
+        if crawler:
+            try:
+                await crawler.__aexit__(None, None, None)
+            except Exception as e:
+                print(f"Error closing crawler: {str(e)}")
+
+    scraper.save_results(results, f"scraped_docs_{worker_id}.json")
+
+async def reclean(args: argparse.Namespace) -> None:
+    """
+    Clean again pages processed before the boilerplate they contain was learned
+
+    Only pages in this host's archive are re-processed; other hosts re-clean
+    the pages they crawled.
+    """
+    scraper = open_scraper(args)
+    results = await scraper.reclean_stale_pages([])
+    if results:
+        scraper.save_results(results, f"recleaned_docs_{socket.gethostname()}.json")
+
+def worker_process(args: argparse.Namespace) -> None:
+    asyncio.run(run_worker(args))
+
+def seed(args: argparse.Namespace) -> None:
+    """Queue the sitemap's URLs for crawling"""
+    scraper = FlutterFlowScraper()
+    queue = open_queue(args, scraper)
+    if args.reset:
+        queue.reset()
+    added = queue.enqueue(scraper.get_urls_from_sitemap())
+    print(f"Queued {added} new URLs")
+    print_status(queue)
+
+def print_status(queue) -> None:
+    counts = queue.counts()
+    print(", ".join(f"{state}: {counts[state]}" for state in (PENDING, LEASED, DONE, FAILED)))
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Sharded crawl of the FlutterFlow documentation from a shared work queue")
+    parser.add_argument("command", choices=["seed", "work", "status"], help="seed the queue from the sitemap, run workers, or show progress")
+    parser.add_argument("--queue", choices=["sqlite", "supabase"], default="sqlite", help="sqlite for workers on one host, supabase for several hosts")
+    parser.add_argument("--queue-path", default="output/crawl_queue.sqlite", help="SQLite queue file")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host")
+    parser.add_argument("--batch-size", type=int, default=2, help="URLs claimed per worker at a time")
+    parser.add_argument("--lease-seconds", type=int, default=300, help="Lease length; renewed every third of it")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Claims per URL before it is marked failed")
+    parser.add_argument("--poll-interval", type=float, default=10, help="Seconds to wait when nothing can be claimed")
+    parser.add_argument("--max-queue-errors", type=int, default=10, help="Queue errors in a row before a worker gives up")
+    parser.add_argument("--max-crawl-failures", type=int, default=3, help="Failed crawls in a row before a worker restarts its browser")
+    parser.add_argument("--reset", action="store_true", help="With seed, queue every known URL again")
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        seed(args)
+    elif args.command == "status":
+        print_status(open_queue(args))
+    else:
+        if args.processes == 1:
+            worker_process(args)
+        else:
+            # Separate processes so each browser and event loop gets its own core
+            processes = [multiprocessing.Process(target=worker_process, args=(args,)) for _ in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        asyncio.run(reclean(args))
+
+if __name__ == "__main__":
+    main()
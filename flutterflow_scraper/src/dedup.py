@@ -0,0 +1,413 @@
+import hashlib
+import math
+import random
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Blocks that are always boilerplate on the Docusaurus docs site
+DEFAULT_BOILERPLATE_PATTERNS = [
+    r"^was this (page |article )?helpful\??",
+    r"^edit this page",
+    r"^last updated on ",
+    r"^(previous|next)\s*(\[|«|»|$)",
+]
+
+# Largest 61-bit Mersenne prime, used for MinHash permutations
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Schema version of the dedup state file, stored in SQLite's user_version
+DEDUP_STATE_VERSION = 2
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial differences don't matter"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def signature_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimate the Jaccard similarity of two MinHash signatures"""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+class SqliteDedupStore:
+    """
+    Boilerplate and near-duplicate state in a local SQLite file
+
+    Records which blocks each page contains, keyed by page. A block's count is
+    the number of pages currently containing it, so re-crawling a page does not
+    inflate counts and a page whose content changed is recounted. Each block
+    also records whether it was removed as repeated when its page was last
+    cleaned, so pages cleaned under an outdated decision can be found.
+
+    Also keeps the MinHash signature and LSH band keys of every indexed page,
+    so pages skipped as unchanged on later crawls are still matched against.
+    """
+
+    def __init__(self, path: Path):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        # Pages may be cleaned from executor threads; keep their statements out of each other's transactions
+        self.lock = threading.Lock()
+        self.conn.execute("pragma journal_mode=wal")
+        version = self.conn.execute("pragma user_version").fetchone()[0]
+        if version not in (0, 1, DEDUP_STATE_VERSION):
+            raise ValueError(f"{path} has dedup state version {version}, expected {DEDUP_STATE_VERSION}; delete it to relearn")
+        if version == 1:
+            # Version 1 did not record cleaning decisions; unknown decisions are never reported stale
+            self.conn.execute("alter table page_blocks add column repeated integer")
+        self.conn.execute("""
+            create table if not exists page_blocks (
+                page_key text not null,
+                block_key text not null,
+                repeated integer,  -- 1 removed as repeated, 0 kept, null not decided by count
+                primary key (page_key, block_key)
+            )
+        """)
+        self.conn.execute("create index if not exists page_blocks_block on page_blocks (block_key)")
+        self.conn.execute("""
+            create table if not exists page_signatures (
+                page_key text primary key,
+                signature text not null
+            )
+        """)
+        self.conn.execute("""
+            create table if not exists page_bands (
+                band_key text not null,
+                page_key text not null,
+                primary key (band_key, page_key)
+            )
+        """)
+        self.conn.execute("create index if not exists page_bands_page on page_bands (page_key)")
+        self.conn.execute(f"pragma user_version = {DEDUP_STATE_VERSION}")
+
+    def replace_page_blocks(self, page_key: str, block_keys: Iterable[str]) -> Tuple[Dict[str, int], int]:
+        """
+        Record the blocks a page contains now, replacing what it contained before
+
+        Returns:
+            tuple: Number of pages containing each of the page's blocks, and the
+            number of pages recorded
+        """
+        with self.lock:
+            self.conn.execute("begin immediate")
+            try:
+                self.conn.execute("delete from page_blocks where page_key = ?", (page_key,))
+                self.conn.executemany(
+                    "insert or ignore into page_blocks (page_key, block_key) values (?, ?)",
+                    [(page_key, key) for key in set(block_keys)]
+                )
+                counts = dict(self.conn.execute(
+                    "select block_key, count(*) from page_blocks "
+                    "where block_key in (select block_key from page_blocks where page_key = ?) "
+                    "group by block_key",
+                    (page_key,)
+                ).fetchall())
+                total_pages = self.conn.execute("select count(distinct page_key) from page_blocks").fetchone()[0]
+                self.conn.execute("commit")
+                return counts, total_pages
+            except Exception:
+                self.conn.execute("rollback")
+                raise
+
+    def record_repeated(self, page_key: str, repeated: Dict[str, bool]) -> None:
+        """Record which of a page's blocks were removed as repeated when it was cleaned"""
+        with self.lock:
+            self.conn.executemany(
+                "update page_blocks set repeated = ? where page_key = ? and block_key = ?",
+                [(int(flag), page_key, key) for key, flag in repeated.items()]
+            )
+
+    def stale_pages(self, min_pages: int) -> List[str]:
+        """Pages with a block kept below min_pages that is now repeated on min_pages pages, or the reverse"""
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "with counts as (select block_key, count(*) as pages from page_blocks group by block_key) "
+                "select distinct b.page_key from page_blocks b join counts c on c.block_key = b.block_key "
+                "where (b.repeated = 0 and c.pages >= ?) or (b.repeated = 1 and c.pages < ?) "
+                "order by b.page_key",
+                (min_pages, min_pages)
+            ).fetchall()]
+
+    def page_count(self) -> int:
+        with self.lock:
+            return self.conn.execute("select count(distinct page_key) from page_blocks").fetchone()[0]
+
+    def remove_signature(self, page_key: str) -> None:
+        """Stop matching against a page, e.g. because it could not be stored"""
+        with self.lock:
+            self.conn.execute("begin immediate")
+            try:
+                self.conn.execute("delete from page_signatures where page_key = ?", (page_key,))
+                self.conn.execute("delete from page_bands where page_key = ?", (page_key,))
+                self.conn.execute("commit")
+            except Exception:
+                self.conn.execute("rollback")
+                raise
+
+    def match_or_add_signature(self, page_key: str, signature: Tuple[int, ...], band_keys: List[str], threshold: float) -> Optional[str]:
+        """
+        Find the page most similar to signature, or index signature under page_key if none reaches threshold
+
+        The page's previous signature is replaced either way, so a page that
+        changed, or became a duplicate, is no longer matched by its old content.
+
+        Returns:
+            str: Key of the near-duplicate page, or None
+        """
+        with self.lock:
+            self.conn.execute("begin immediate")
+            try:
+                self.conn.execute("delete from page_signatures where page_key = ?", (page_key,))
+                self.conn.execute("delete from page_bands where page_key = ?", (page_key,))
+
+                placeholders = ", ".join("?" * len(band_keys))
+                candidates = self.conn.execute(
+                    "select distinct s.page_key, s.signature from page_bands b "
+                    "join page_signatures s on s.page_key = b.page_key "
+                    f"where b.band_key in ({placeholders})",
+                    band_keys
+                ).fetchall()
+
+                best_key, best_score = None, 0.0
+                for key, stored in candidates:
+                    score = signature_similarity(signature, tuple(int(value) for value in stored.split(",")))
+                    if score >= threshold and score > best_score:
+                        best_key, best_score = key, score
+
+                if best_key is None:
+                    self.conn.execute(
+                        "insert into page_signatures (page_key, signature) values (?, ?)",
+                        (page_key, ",".join(str(value) for value in signature))
+                    )
+                    self.conn.executemany(
+                        "insert or ignore into page_bands (band_key, page_key) values (?, ?)",
+                        [(band_key, page_key) for band_key in band_keys]
+                    )
+                self.conn.execute("commit")
+                return best_key
+            except Exception:
+                self.conn.execute("rollback")
+                raise
+
+class SupabaseDedupStore:
+    """
+    Boilerplate and near-duplicate state in Supabase, shared by crawl workers on any host
+
+    Same interface as SqliteDedupStore. Updates run in the database (see
+    supabase/dedup_state.sql), so every worker learns from pages crawled by
+    the others as they are stored.
+    """
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    def replace_page_blocks(self, page_key: str, block_keys: Iterable[str]) -> Tuple[Dict[str, int], int]:
+        result = self.supabase.rpc("replace_page_blocks", {
+            "page_key": page_key,
+            "block_keys": sorted(set(block_keys))
+        }).execute()
+        data = result.data or {}
+        return data.get("counts") or {}, data.get("pages") or 0
+
+    def record_repeated(self, page_key: str, repeated: Dict[str, bool]) -> None:
+        self.supabase.rpc("record_repeated_blocks", {
+            "page_key": page_key,
+            "repeated_keys": [key for key, flag in repeated.items() if flag],
+            "kept_keys": [key for key, flag in repeated.items() if not flag]
+        }).execute()
+
+    def stale_pages(self, min_pages: int) -> List[str]:
+        result = self.supabase.rpc("stale_dedup_pages", {"min_pages": min_pages}).execute()
+        return [row["page_key"] for row in result.data or []]
+
+    def page_count(self) -> int:
+        return self.supabase.rpc("dedup_page_count", {}).execute().data or 0
+
+    def record_repeated(self, page_key: str, repeated: Dict[str, bool]) -> None:
+        """Record which of a page's blocks were removed as repeated when it was cleaned"""
+        with self.lock:
+            self.conn.executemany(
+                "update page_blocks set repeated = ? where page_key = ? and block_key = ?",
+                [(int(flag), page_key, key) for key, flag in repeated.items()]
+            )
+
+    def stale_pages(self, min_pages: int) -> List[str]:
+        """Pages with a block kept below min_pages that is now repeated on min_pages pages, or the reverse"""
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "with counts as (select block_key, count(*) as pages from page_blocks group by block_key) "
+                "select distinct b.page_key from page_blocks b join counts c on c.block_key = b.block_key "
+                "where (b.repeated = 0 and c.pages >= ?) or (b.repeated = 1 and c.pages < ?) "
+                "order by b.page_key",
+                (min_pages, min_pages)
+            ).fetchall()]
+
+    def page_count(self) -> int:
+        with self.lock:
+            return self.conn.execute("select count(distinct page_key) from page_blocks").fetchone()[0]
+
+    def match_or_add_signature(self, page_key: str, signature: Tuple[int, ...], band_keys: List[str], threshold: float) -> Optional[str]:
+        result = self.supabase.rpc("match_or_add_signature", {
+            "page_key": page_key,
+            "signature": list(signature),
+            "band_keys": band_keys,
+            "threshold": threshold
+        }).execute()
+        return result.data or None
+
+    def remove_signature(self, page_key: str) -> None:
+        self.supabase.rpc("remove_page_signature", {"page_key": page_key}).execute()
+
+class BoilerplateFilter:
+    """
+    Strip blocks of markdown that repeat across many pages
+
+    Pages are split into blocks on blank lines. Every block is fingerprinted and
+    the blocks of each page are recorded in a state store as pages are cleaned.
+    A block found on at least min_fraction of the recorded pages, and on no
+    fewer than min_pages, is treated as boilerplate and removed. The store
+    persists between crawls, so later crawls strip learned boilerplate from the
+    first page on.
+
+    Pages cleaned before a block crossed the threshold (or after it fell back
+    below it) are reported by stale_pages() so they can be cleaned again.
+    learn() records a page without cleaning it, for callers that can see every
+    page before cleaning any.
+    """
+
+    def __init__(self, store, min_pages: int = 4, min_fraction: float = 0.5, patterns: Optional[List[str]] = None):
+        self.store = store
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.patterns = [re.compile(p, re.IGNORECASE) for p in (patterns if patterns is not None else DEFAULT_BOILERPLATE_PATTERNS)]
+
+    @staticmethod
+    def split_blocks(markdown: str) -> List[str]:
+        """Split markdown into blank-line separated blocks"""
+        return [block for block in re.split(r"\n\s*\n", markdown) if block.strip()]
+
+    @staticmethod
+    def block_key(block: str) -> str:
+        """Fingerprint a block, ignoring case and whitespace"""
+        return hashlib.sha1(normalize_text(block).encode("utf-8")).hexdigest()[:16]
+
+    def threshold(self, total_pages: int) -> int:
+        """Number of pages a block must be found on to count as boilerplate"""
+        return max(self.min_pages, math.ceil(self.min_fraction * total_pages))
+
+    def fixed_decision(self, block: str) -> Optional[bool]:
+        """Whether a block is boilerplate regardless of how often it repeats, or None if that depends on its count"""
+        normalized = normalize_text(block)
+        if any(pattern.search(normalized) for pattern in self.patterns):
+            return True
+        # Headings repeat legitimately ("## Overview") and carry page structure
+        if normalized.startswith("#"):
+            return False
+        return None
+
+    def learn(self, page_key: str, markdown: str) -> None:
+        """Record a page's blocks without cleaning it"""
+        blocks = self.split_blocks(markdown) if markdown else []
+        self.store.replace_page_blocks(page_key, [self.block_key(block) for block in blocks])
+
+    def clean(self, markdown: str, page_key: str) -> str:
+        """
+        Remove boilerplate blocks from a page and learn from its blocks
+        
+        Args:
+            markdown: Page markdown
+            page_key: Identifies the page (e.g. its URL); its previous blocks are replaced
+
+        Returns:
+            str: The page markdown without boilerplate blocks
+        """
+        blocks = self.split_blocks(markdown) if markdown else []
+        keys = [self.block_key(block) for block in blocks]
+        counts, total_pages = self.store.replace_page_blocks(page_key, keys)
+        threshold = self.threshold(total_pages)
+
+        kept = []
+        repeated: Dict[str, bool] = {}
+        for block, key in zip(blocks, keys):
+            remove = self.fixed_decision(block)
+            if remove is None:
+                remove = repeated[key] = counts.get(key, 0) >= threshold
+            if not remove:
+                kept.append(block)
+
+        self.store.record_repeated(page_key, repeated)
+        return "\n\n".join(kept)
+
+    def stale_pages(self) -> List[str]:
+        """Pages whose last cleaning no longer matches the learned boilerplate"""
+        return self.store.stale_pages(self.threshold(self.store.page_count()))
+
+class NearDuplicateIndex:
+    """
+    Detect near-duplicate pages with MinHash signatures over word shingles
+
+    Signatures are bucketed with locality-sensitive hashing (bands of rows), so
+    a lookup only compares against pages sharing at least one band. Candidates
+    are accepted when their estimated Jaccard similarity reaches threshold.
+    Signatures are kept in a state store, so they persist between crawls.
+    """
+
+    def __init__(self, store, num_perm: int = 64, bands: int = 16, threshold: float = 0.9, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.store = store
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        # Fixed seed so signatures are comparable between runs
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> set:
+        words = normalize_text(text).split()
+        if len(words) < self.shingle_size:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """Compute the MinHash signature of a text, or None if it has no words"""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in self.shingles(text)
+        ]
+        if not hashes:
+            return None
+        return tuple(
+            min((a * h + b) % MERSENNE_PRIME for h in hashes)
+            for a, b in self.permutations
+        )
+
+    def band_keys(self, signature: Tuple[int, ...]) -> List[str]:
+        """Hash each band of rows, prefixed with the band number, into a bucket key"""
+        return [
+            f"{band}:" + hashlib.blake2b(
+                ",".join(str(value) for value in signature[band * self.rows:(band + 1) * self.rows]).encode("utf-8"),
+                digest_size=8
+            ).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def add_or_find(self, key: str, text: str) -> Optional[str]:
+        """
+        Return the key of a near-duplicate page, or index text under key if there is none
+        
+        Any signature previously indexed under key is replaced.
+        """
+        signature = self.signature(text)
+        if not signature:
+            return None
+        return self.store.match_or_add_signature(key, signature, self.band_keys(signature), self.threshold)
+
+    def remove(self, key: str) -> None:
+        """Remove the page indexed under key, so later pages are not matched against it"""
+        self.store.remove_signature(key)
@@ -0,0 +1,216 @@
+import argparse
+import os
+from typing import Mapping
+from dotenv import load_dotenv
+
+# Embedding model used for both documents and queries
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# text-embedding-3-small returns 1536 dimensions unless asked for fewer
+DEFAULT_EMBEDDING_DIMENSIONS = 1536
+MAX_EMBEDDING_DIMENSIONS = 1536
+
+# "full" stores pgvector vector (float32), "half" stores halfvec (float16)
+EMBEDDING_PRECISIONS = ("full", "half")
+
+def get_embedding_dimensions(env: Mapping[str, str] = os.environ) -> int:
+    """
+    Read the embedding dimension from EMBEDDING_DIMENSIONS
+    
+    Must match the dimension of the documents.embedding column and of the
+    match_documents functions in Supabase.
+    """
+    dimensions = int(env.get("EMBEDDING_DIMENSIONS") or DEFAULT_EMBEDDING_DIMENSIONS)
+    if not 1 <= dimensions <= MAX_EMBEDDING_DIMENSIONS:
+        raise ValueError(f"EMBEDDING_DIMENSIONS must be between 1 and {MAX_EMBEDDING_DIMENSIONS}, got {dimensions}")
+    return dimensions
+
+def get_embedding_precision(env: Mapping[str, str] = os.environ) -> str:
+    """
+    Read the embedding storage precision from EMBEDDING_PRECISION
+    
+    Must match the type of the documents.embedding column: "full" for vector,
+    "half" for halfvec.
+    """
+    precision = (env.get("EMBEDDING_PRECISION") or "full").lower()
+    if precision not in EMBEDDING_PRECISIONS:
+        raise ValueError(f"EMBEDDING_PRECISION must be one of {EMBEDDING_PRECISIONS}, got {precision}")
+    return precision
+
+def get_vector_type(env: Mapping[str, str] = os.environ) -> str:
+    """Return the pgvector column type matching the configured embeddings, e.g. halfvec(512)"""
+    column_type = "halfvec" if get_embedding_precision(env) == "half" else "vector"
+    return f"{column_type}({get_embedding_dimensions(env)})"
+
+# Column the re-embedded vectors are written to when the dimension changes
+NEXT_EMBEDDING_COLUMN = "embedding_next"
+
+SEARCH_SQL_TEMPLATE = """
+  -- The search functions and index depend on the column type, so drop them first
+  drop function if exists match_documents(vector);
+  drop function if exists match_documents(halfvec);
+  drop function if exists match_documents_json(json);
+  drop index if exists documents_embedding_idx;
+
+  {alter_column}
+
+  -- Approximate nearest neighbour index for cosine distance
+  create index documents_embedding_idx
+      on documents using hnsw (embedding {ops});
+
+  -- Function that accepts a single query_embedding parameter
+  -- Ordering by distance (rather than similarity) lets Postgres use the index
+  create or replace function match_documents (
+    query_embedding {vector_type}
+  )
+  returns table (
+    id bigint,
+    content text,
+    metadata jsonb,
+    similarity float
+  )
+  language sql
+  as $$
+    select
+      id,
+      content,
+      metadata,
+      1 - (embedding <=> query_embedding) as similarity
+    from documents
+    where 1 - (embedding <=> query_embedding) > 0.7
+    order by embedding <=> query_embedding
+    limit 3;
+  $$;
+
+  -- Function that accepts a single JSON parameter (alternative method)
+  create or replace function match_documents_json(
+    query_json json
+  )
+  returns table (
+    id bigint,
+    content text,
+    metadata jsonb,
+    similarity float
+  )
+  language sql
+  as $$
+    select
+      id,
+      content,
+      metadata,
+      1 - (embedding <=> (query_json->>'query_embedding')::{vector_type}) as similarity
+    from documents
+    where 1 - (embedding <=> (query_json->>'query_embedding')::{vector_type}) > 0.7
+    order by embedding <=> (query_json->>'query_embedding')::{vector_type}
+    limit 3;
+  $$;"""
+
+MIGRATION_SQL_TEMPLATE = """-- Migrate document embeddings to {vector_type}
+--
+-- Generated by: python src/embedding_config.py --sql
+-- for EMBEDDING_DIMENSIONS={dimensions} and EMBEDDING_PRECISION={precision}.
+-- Requires pgvector 0.7.0 or newer when using halfvec.
+--
+-- If the dimension is unchanged, the stored embeddings are cast in place and
+-- search keeps working. Otherwise they must be regenerated: they are written
+-- to a new {next_column} column while search keeps using the old one, then
+-- swapped in with: python src/embedding_config.py --sql --swap
+
+do $migrate$
+declare
+  current_dimensions int;
+begin
+  -- pgvector stores the dimension as the column's type modifier
+  select a.atttypmod into current_dimensions
+  from pg_attribute a
+  where a.attrelid = 'documents'::regclass and a.attname = 'embedding';
+
+  if current_dimensions = {dimensions} then
+{search_sql}
+
+    raise notice 'Converted embeddings in place to {vector_type}';
+  else
+    alter table documents add column if not exists {next_column} {vector_type};
+
+    raise notice 'Added {next_column} {vector_type}. Run python src/reembed.py --column {next_column}, then python src/embedding_config.py --sql --swap';
+  end if;
+end
+$migrate$;
+"""
+
+SWAP_SQL_TEMPLATE = """-- Swap the re-embedded {next_column} column in as documents.embedding
+--
+-- Generated by: python src/embedding_config.py --sql --swap
+-- for EMBEDDING_DIMENSIONS={dimensions} and EMBEDDING_PRECISION={precision}.
+-- Run after python src/reembed.py --column {next_column} has finished.
+
+do $swap$
+declare
+  missing bigint;
+begin
+  select count(*) into missing from documents where {next_column} is null and embedding is not null;
+  if missing > 0 then
+    raise exception '% documents are not re-embedded yet; run python src/reembed.py --column {next_column}', missing;
+  end if;
+{search_sql}
+end
+$swap$;
+"""
+
+def render_search_sql(env: Mapping[str, str], alter_column: str) -> str:
+    """Render the statements that change the embedding column and recreate the index and search functions"""
+    return SEARCH_SQL_TEMPLATE.format(
+        alter_column=alter_column,
+        vector_type=get_vector_type(env),
+        ops="halfvec_cosine_ops" if get_embedding_precision(env) == "half" else "vector_cosine_ops",
+    )
+
+def render_migration_sql(env: Mapping[str, str] = os.environ) -> str:
+    """
+    Render the SQL that moves the documents table and search functions to the configured embeddings
+    
+    Generated from the same settings the scraper and agent read, so the
+    schema cannot drift from the Python side. Existing embeddings are never
+    cleared: they are cast when only the precision changes, and otherwise
+    kept searchable until re-embedded vectors are swapped in.
+    """
+    vector_type = get_vector_type(env)
+    return MIGRATION_SQL_TEMPLATE.format(
+        vector_type=vector_type,
+        dimensions=get_embedding_dimensions(env),
+        precision=get_embedding_precision(env),
+        next_column=NEXT_EMBEDDING_COLUMN,
+        search_sql=render_search_sql(
+            env,
+            f"alter table documents\n      alter column embedding type {vector_type} using embedding::{vector_type};"
+        ),
+    )
+
+def render_swap_sql(env: Mapping[str, str] = os.environ) -> str:
+    """Render the SQL that replaces documents.embedding with the re-embedded column"""
+    return SWAP_SQL_TEMPLATE.format(
+        dimensions=get_embedding_dimensions(env),
+        precision=get_embedding_precision(env),
+        next_column=NEXT_EMBEDDING_COLUMN,
+        search_sql=render_search_sql(
+            env,
+            f"alter table documents drop column embedding;\n"
+            f"  alter table documents rename column {NEXT_EMBEDDING_COLUMN} to embedding;"
+        ),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the configured embedding settings")
+    parser.add_argument("--sql", action="store_true", help="Print the Supabase migration for the configured embeddings")
+    parser.add_argument("--swap", action="store_true", help="With --sql, print the SQL that swaps in the re-embedded column")
+    args = parser.parse_args()
+    
+    # Same .env file the scraper reads
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
+    if args.sql:
+        print(render_swap_sql() if args.swap else render_migration_sql(), end="")
+    else:
+        print(f"{EMBEDDING_MODEL} stored as {get_vector_type()}")
+
+if __name__ == "__main__":
+    main()
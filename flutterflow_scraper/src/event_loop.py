@@ -0,0 +1,37 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+class BackgroundEventLoop:
+    """
+    Run coroutines on one long-lived event loop in a daemon thread
+
+    Async HTTP clients keep their connection pools bound to the loop that
+    created them. Reusing a single loop, instead of calling asyncio.run() per
+    request, keeps those pools and their TLS connections alive between calls.
+    """
+
+    def __init__(self, name: str = "agent-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def _run_forever(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the background loop and wait for its result
+
+        Safe to call from any thread other than the loop's own.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    def close(self) -> None:
+        """Stop the loop and wait for its thread to exit"""
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+import requests
+
+@dataclass
+class CachedResponse:
+    """Result of a conditional request through the HTTP cache"""
+    url: str
+    unchanged: bool
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    path: Optional[Path] = None
+
+class HttpCache:
+    """
+    On-disk HTTP cache using conditional requests
+
+    Stores the ETag and Last-Modified validators of each URL and sends them
+    back as If-None-Match and If-Modified-Since. A 304 response means the
+    resource is unchanged since it was last cached or processed.
+    """
+
+    def __init__(self, cache_dir: Path, timeout: float = 30, chunk_size: int = 64 * 1024):
+        self.cache_dir = cache_dir
+        self.meta_dir = cache_dir / "meta"
+        self.body_dir = cache_dir / "bodies"
+        self.meta_dir.mkdir(parents=True, exist_ok=True)
+        self.body_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        # Reuse connections across requests to the same host
+        self.session = requests.Session()
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def meta_path(self, url: str) -> Path:
+        return self.meta_dir / f"{self.url_key(url)}.json"
+
+    def body_path(self, url: str) -> Path:
+        return self.body_dir / self.url_key(url)
+
+    def load_meta(self, url: str) -> Dict:
+        try:
+            with open(self.meta_path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_meta(self, response: CachedResponse) -> None:
+        meta = {"url": response.url, "etag": response.etag, "last_modified": response.last_modified}
+        self.write_atomic(self.meta_path(response.url), json.dumps(meta).encode("utf-8"))
+
+    def write_atomic(self, path: Path, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def conditional_headers(self, meta: Dict) -> Dict[str, str]:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def fetch(self, url: str) -> CachedResponse:
+        """
+        Fetch a URL into the cache, streaming the body to disk
+
+        Returns:
+            CachedResponse: With path pointing at the cached body. unchanged is
+            True when the server answered 304 and the cached body was reused.
+        """
+        body_path = self.body_path(url)
+        meta = self.load_meta(url) if body_path.exists() else {}
+
+        with self.session.get(url, headers=self.conditional_headers(meta), stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304 and meta:
+                return CachedResponse(url, True, meta.get("etag"), meta.get("last_modified"), body_path)
+            response.raise_for_status()
+
+            # Stream to a temporary file so a failed download never replaces a good body
+            fd, tmp_path = tempfile.mkstemp(dir=self.body_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                os.replace(tmp_path, body_path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+
+            cached = CachedResponse(
+                url,
+                False,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                body_path
+            )
+
+        self.save_meta(cached)
+        return cached
+
+    def revalidate(self, url: str) -> CachedResponse:
+        """
+        Check whether a URL changed since it was last marked as processed
+
+        Sends a conditional HEAD request, so no body is transferred and the
+        connection goes straight back to the pool. The page itself is fetched
+        by the browser. The new validators are not saved until mark_processed
+        is called, so a page that fails processing is fetched again next time.
+        """
+        meta = self.load_meta(url)
+        response = self.session.head(url, headers=self.conditional_headers(meta), allow_redirects=True, timeout=self.timeout)
+        if response.status_code == 304 and meta:
+            return CachedResponse(url, True, meta.get("etag"), meta.get("last_modified"))
+        response.raise_for_status()
+        return CachedResponse(url, False, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    def mark_processed(self, response: CachedResponse) -> None:
+        """Save the validators of a revalidated URL so the next run can skip it if unchanged"""
+        if response.etag or response.last_modified:
+            self.save_meta(response)
@@ -0,0 +1,161 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional
+import openai
+
+# Errors worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After delay in seconds from an API error's response, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    # Retry-After may also be an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class AdaptiveRateController:
+    """
+    Adaptive (AIMD) concurrency control for calls to a rate-limited API
+
+    The number of requests allowed in flight grows by roughly one for every
+    limit successful requests that finish within target_latency (additive
+    increase). It is multiplied by decrease_factor on a 429 (multiplicative
+    decrease) and shrinks slightly when responses get slow. A 429 also pauses
+    every caller for the server's Retry-After delay. Each request gets a timeout
+    and a bounded number of retries with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        target_latency: float = 10.0,
+        timeout: float = 60.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        decrease_factor: float = 0.5,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.decrease_factor = decrease_factor
+
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Wait for a free slot and for any Retry-After pause to end"""
+        while True:
+            pause = self.blocked_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+                # A 429 may have arrived while waiting
+                if time.monotonic() < self.blocked_until:
+                    continue
+                self.in_flight += 1
+                return
+
+    async def release(self) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            # The limit may have grown, so wake every waiter to re-check
+            self.condition.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        if latency <= self.target_latency:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self.decrease(0.9)
+
+    def on_rate_limited(self, retry_after: Optional[float]) -> None:
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.decrease(self.decrease_factor)
+
+    def decrease(self, factor: float) -> None:
+        # Requests in flight together often fail together; only count that as one signal
+        now = time.monotonic()
+        if now - self.last_decrease < 1.0:
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        print(f"{self.name}: reduced concurrency limit to {int(self.limit)}")
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Call an async API function under rate control
+
+        Retries rate limits, timeouts, connection and server errors up to
+        max_retries times, then re-raises the last error.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout=self.timeout)
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, openai.RateLimitError):
+                    retry_after = get_retry_after(e)
+                    self.on_rate_limited(retry_after)
+                    # The shared pause already covers Retry-After
+                    delay = 0.0 if retry_after else self.backoff(attempt)
+                else:
+                    self.decrease(0.9)
+                    delay = self.backoff(attempt)
+
+                if attempt == self.max_retries:
+                    raise
+                print(f"{self.name}: {type(e).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            else:
+                self.on_success(time.monotonic() - start)
+                return result
+            finally:
+                await self.release()
+
+            await asyncio.sleep(delay)
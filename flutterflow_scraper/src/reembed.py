@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+from typing import Dict, List
+from tqdm import tqdm
+from scraper import FlutterFlowScraper
+
+async def reembed_documents(scraper: FlutterFlowScraper, page_size: int = 100, max_concurrent: int = 8, only_missing: bool = True, column: str = "embedding") -> int:
+    """
+    Regenerate embeddings for stored documents using the configured dimensions
+
+    Reads rows from the documents table in id order and writes back a fresh
+    embedding for each one. Run after the migration printed by
+    `python src/embedding_config.py --sql`; when it changed the dimension, write
+    to the embedding_next column it added, then swap that column in.
+
+    Args:
+        scraper: Scraper providing the Supabase and OpenAI clients
+        page_size: Number of rows fetched per request
+        max_concurrent: Maximum number of embedding requests in flight
+        only_missing: Only re-embed rows whose embedding is null
+        column: Column the embeddings are written to
+
+    Returns:
+        int: Number of documents re-embedded
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    updated = 0
+
+    async def reembed_row(row: Dict, pbar: tqdm) -> bool:
+        async with semaphore:
+            try:
+                embedding = await scraper.generate_embedding(row["content"] or "")
+                if not embedding:
+                    return False
+                scraper.supabase.table("documents").update({column: embedding}).eq("id", row["id"]).execute()
+                return True
+            except Exception as e:
+                print(f"Error re-embedding document {row['id']}: {str(e)}")
+                return False
+            finally:
+                pbar.update(1)
+
+    last_id = 0
+    with tqdm(desc="Re-embedding documents") as pbar:
+        while True:
+            # Page by id so rows updated in this run are not fetched again
+            query = scraper.supabase.table("documents").select("id, content").gt("id", last_id)
+            if only_missing:
+                query = query.is_(column, "null")
+            rows: List[Dict] = query.order("id").limit(page_size).execute().data
+            if not rows:
+                break
+
+            results = await asyncio.gather(*[reembed_row(row, pbar) for row in rows])
+            updated += sum(results)
+            last_id = rows[-1]["id"]
+
+    return updated
+
+async def main():
+    parser = argparse.ArgumentParser(description="Regenerate document embeddings with the configured dimensions and precision")
+    parser.add_argument("--all", action="store_true", help="Re-embed every document, not just rows without an embedding")
+    parser.add_argument("--page-size", type=int, default=100, help="Rows fetched from Supabase per request")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="Maximum embedding requests in flight")
+    parser.add_argument("--column", default="embedding", help="Column to write, e.g. embedding_next while changing the dimension")
+    args = parser.parse_args()
+
+    scraper = FlutterFlowScraper()
+    updated = await reembed_documents(
+        scraper,
+        page_size=args.page_size,
+        max_concurrent=args.max_concurrent,
+        only_missing=not args.all,
+        column=args.column
+    )
+    print(f"Re-embedded {updated} documents")
+
+if __name__ == "__main__":
+    asyncio.run(main())
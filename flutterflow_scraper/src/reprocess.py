@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+from typing import Dict, List, Optional
+from tqdm import tqdm
+from scraper import FlutterFlowScraper
+
+async def reprocess_archive(scraper: FlutterFlowScraper, max_concurrent: int = 8, regenerate_markdown: bool = False, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Rebuild summaries, embeddings and Supabase rows from the page archive
+
+    No browser is started. Every page's blocks are learned before any page is
+    cleaned, so boilerplate is stripped from all pages alike. Pages are then
+    processed concurrently, bounded by max_concurrent, so the run is limited by
+    CPU and the LLM/embedding APIs.
+
+    Args:
+        scraper: Scraper providing the archive and the processing pipeline
+        max_concurrent: Maximum number of pages processed at once
+        regenerate_markdown: Rebuild markdown from the archived HTML with the
+            current markdown generator instead of using the archived markdown
+        limit: Only process the first N archived pages
+
+    Returns:
+        list: Document data for every page processed successfully
+    """
+    urls = list(scraper.archive.urls())
+    if limit:
+        urls = urls[:limit]
+
+    if not regenerate_markdown:
+        for url in tqdm(urls, desc="Learning boilerplate"):
+            record = scraper.archive.get(url)
+            if record is not None:
+                scraper.boilerplate_filter.learn(url, record["markdown"])
+
+    results = await scraper.reprocess_pages(urls, max_concurrent=max_concurrent, regenerate_markdown=regenerate_markdown)
+    # Regenerated markdown is only learned as it is cleaned, so clean again what changed since
+    return await scraper.reclean_stale_pages(results, max_concurrent=max_concurrent, regenerate_markdown=regenerate_markdown)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild summaries, embeddings and Supabase rows from archived pages")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="Maximum pages processed at once")
+    parser.add_argument("--regenerate-markdown", action="store_true", help="Rebuild markdown from the archived HTML")
+    parser.add_argument("--limit", type=int, help="Only process the first N archived pages")
+    args = parser.parse_args()
+
+    scraper = FlutterFlowScraper()
+    results = await reprocess_archive(
+        scraper,
+        max_concurrent=args.max_concurrent,
+        regenerate_markdown=args.regenerate_markdown,
+        limit=args.limit
+    )
+    scraper.save_results(results, "reprocessed_docs.json")
+
+if __name__ == "__main__":
+    asyncio.run(main())
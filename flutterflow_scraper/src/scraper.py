@@ -1,9 +1,10 @@
 import asyncio
+import copy
+import gzip
 import json
 import os
 from pathlib import Path
-from typing import List, Dict, Set
-import requests
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 from lxml import etree
 from tqdm import tqdm
 from urllib.parse import urlparse
@@ -12,6 +13,11 @@ from supabase import create_client, Client
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from crawl4ai.content_filter_strategy import PruningContentFilter
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+from archive import PageArchive
+from dedup import BoilerplateFilter, NearDuplicateIndex, SqliteDedupStore
+from embedding_config import EMBEDDING_MODEL, get_embedding_dimensions, get_vector_type
+from http_cache import CachedResponse, HttpCache
+from rate_control import AdaptiveRateController
 
 class FlutterFlowScraper:
     def __init__(self):
@@ -32,7 +38,16 @@ class FlutterFlowScraper:
         openai_api_key = env_vars.get("OPENAI_API_KEY")
         if not openai_api_key:
             raise ValueError("OPENAI_API_KEY not found in .env file")
-        self.openai_client = AsyncOpenAI(api_key=openai_api_key, base_url="https://litellm.deriv.ai/v1")
+        # Retries are handled by the rate controllers below, not by the client
+        self.openai_client = AsyncOpenAI(api_key=openai_api_key, base_url="https://litellm.deriv.ai/v1", max_retries=0)
+        
+        # Adaptive concurrency for LLM and embedding calls, shared by every page being processed
+        self.chat_rate = AdaptiveRateController("summaries", initial_limit=4, max_limit=16, target_latency=15.0, timeout=60.0)
+        self.embedding_rate = AdaptiveRateController("embeddings", initial_limit=8, max_limit=32, target_latency=5.0, timeout=30.0)
+        
+        # Embedding size must match the documents.embedding column in Supabase
+        self.embedding_dimensions = get_embedding_dimensions(env_vars)
+        print(f"Using {get_vector_type(env_vars)} embeddings")
 
         # Initialize Supabase client
         self.supabase_url = env_vars.get("SUPABASE_URL")
@@ -60,6 +75,25 @@ class FlutterFlowScraper:
         
         self.output_dir = Path("output")
         self.output_dir.mkdir(exist_ok=True)
+        
+        # Strip repeated Docusaurus blocks and skip near-duplicate pages before
+        # they are summarized and embedded
+        # The SQLite state file is shared by every crawl process on this host
+        self.dedup_store = SqliteDedupStore(self.output_dir / "dedup.sqlite")
+        self.boilerplate_filter = BoilerplateFilter(self.dedup_store)
+        legacy_state = self.output_dir / "boilerplate_blocks.json"
+        if legacy_state.exists():
+            # Old files hold totals without the pages they came from, so they cannot be recounted
+            print(f"Ignoring {legacy_state} from an older version; boilerplate is relearned in {self.output_dir / 'dedup.sqlite'}")
+        self.duplicate_index = NearDuplicateIndex(self.dedup_store)
+        
+        # Conditional-GET cache for sitemaps and page change detection
+        self.http_cache = HttpCache(self.output_dir / "http_cache")
+        self.skip_unchanged = True  # Skip pages the server reports as unchanged (304)
+        self.unchanged_urls: Set[str] = set()
+        
+        # Raw page archive for re-processing without the browser (see reprocess.py)
+        self.archive = PageArchive(self.output_dir / "archive", max_bytes=2 * 1024 ** 3)
         self.base_url = "https://docs.flutterflow.io"
         self.batch_size = 1  # Process one URL at a time for testing
         self.max_concurrent = 1  # Single concurrent request
@@ -76,6 +110,13 @@ class FlutterFlowScraper:
         # Initialize semaphore for concurrency control
         self.semaphore = asyncio.Semaphore(self.max_concurrent)
         
+        # Crawled pages are summarized, embedded and stored in background tasks while
+        # the browser moves on; the cap stops crawling from running far ahead of the APIs
+        self.max_pending_pages = 32
+        self.pending_pages = asyncio.Semaphore(self.max_pending_pages)
+        self.processing_tasks: Set[asyncio.Task] = set()
+        self.processed_results: List[Dict] = []
+        
         # Disallowed paths from robots.txt
         self.disallowed_paths = [
             "/tags/",
@@ -216,6 +257,11 @@ class FlutterFlowScraper:
                 """
             ]
         )
+        
+        # The HTTP cache decides whether a page changed. Once it has, crawl4ai's
+        # own cached copy is stale, so fetch the page fresh and refresh that cache.
+        self.fresh_run_config = copy.copy(self.run_config)
+        self.fresh_run_config.cache_mode = CacheMode.WRITE_ONLY
 
     def is_allowed_url(self, url: str) -> bool:
         """
@@ -231,38 +277,59 @@ class FlutterFlowScraper:
                 return False
         return True
 
+    def iter_sitemap_urls(self, sitemap_url: str, seen: Optional[Set[str]] = None) -> Iterator[str]:
+        """
+        Stream page URLs from a sitemap, following nested sitemap indexes
+        
+        The sitemap is fetched through the HTTP cache and parsed incrementally,
+        so memory use does not grow with the size of the document.
+        """
+        seen = seen if seen is not None else set()
+        if sitemap_url in seen:
+            return
+        seen.add(sitemap_url)
+        
+        cached = self.http_cache.fetch(sitemap_url)
+        print(f"Sitemap {sitemap_url} {'unchanged' if cached.unchanged else 'downloaded'}")
+        
+        child_sitemaps = []
+        with open(cached.path, "rb") as raw:
+            # Sitemaps may be served gzipped (sitemap.xml.gz)
+            is_gzip = raw.read(2) == b"\x1f\x8b"
+            raw.seek(0)
+            source = gzip.open(raw) if is_gzip else raw
+            
+            # Handles both standard and namespaced XML
+            for _, elem in etree.iterparse(source, events=("end",), tag=("{*}url", "{*}sitemap")):
+                loc = elem.findtext("{*}loc")
+                if loc:
+                    if etree.QName(elem).localname == "sitemap":
+                        child_sitemaps.append(loc.strip())
+                    else:
+                        yield loc.strip()
+                
+                # Free parsed elements as we go
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        
+        for child in child_sitemaps:
+            yield from self.iter_sitemap_urls(child, seen)
+
     def get_urls_from_sitemap(self) -> List[str]:
         """
         Get URLs from sitemap.xml and filter based on robots.txt rules
         """
         try:
             print("Fetching URLs from sitemap.xml...")
-            response = requests.get(f"{self.base_url}/sitemap.xml")
-            response.raise_for_status()
-            
-            # Parse XML
-            root = etree.fromstring(response.content)
-            
-            # Extract URLs (handle both standard and namespaced XML)
-            urls = []
-            namespaces = {'s': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-            
-            # Try different XPath patterns
-            for pattern in ['//url/loc/text()', '//s:url/s:loc/text()']:
-                try:
-                    found_urls = root.xpath(pattern, namespaces=namespaces)
-                    if found_urls:
-                        urls.extend([url.strip() for url in found_urls])
-                except Exception as e:
-                    print(f"Error with XPath pattern {pattern}: {str(e)}")
             
             # Filter URLs based on:
             # 1. Must be documentation URLs
             # 2. Must be allowed by robots.txt
-            filtered_urls = [
-                url for url in urls 
+            filtered_urls = list(dict.fromkeys(
+                url for url in self.iter_sitemap_urls(f"{self.base_url}/sitemap.xml")
                 if url.startswith(self.base_url) and self.is_allowed_url(url)
-            ]
+            ))
             
             print(f"Found {len(filtered_urls)} allowed documentation URLs in sitemap")
             return filtered_urls
@@ -274,23 +341,45 @@ class FlutterFlowScraper:
                 f"{self.base_url}/before-you-begin/setup-flutterflow"
             ]
 
+    def check_unchanged(self, url: str) -> Optional[CachedResponse]:
+        """
+        Revalidate a page against the HTTP cache
+        
+        Returns:
+            CachedResponse: Validation to mark as processed once the page is stored,
+            or None if the check failed and the page should be scraped anyway
+        """
+        try:
+            return self.http_cache.revalidate(url)
+        except Exception as e:
+            print(f"Error checking {url} for changes: {str(e)}")
+            return None
+
     async def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embeddings for the given text using OpenAI's API
+        
+        Raises after bounded retries rather than returning an empty embedding,
+        so a rate-limited page is never stored without one.
         """
         try:
-            response = await self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
+            response = await self.embedding_rate.call(
+                self.openai_client.embeddings.create,
+                model=EMBEDDING_MODEL,
+                input=text,
+                dimensions=self.embedding_dimensions
             )
             return response.data[0].embedding
         except Exception as e:
             print(f"Error generating embedding: {str(e)}")
-            return []
+            raise
 
     async def store_in_supabase(self, doc_data: Dict, embedding: List[float]) -> None:
         """
         Store document data and its embedding in Supabase
+        
+        The Supabase client is synchronous, so the requests run in the default
+        executor and concurrent pages are stored in parallel.
         """
         # Store in documents table
         doc_record = {
@@ -302,13 +391,17 @@ class FlutterFlowScraper:
             "embedding": embedding
         }
         
-        try:
+        def store() -> None:
             # First verify connection and table existence
             test_query = self.supabase.table("documents").select("id").limit(1).execute()
             print("Successfully connected to Supabase and verified table existence")
             
-            # Then attempt to insert the document
-            result = self.supabase.table("documents").insert(doc_record).execute()
+            # Upsert by URL so re-crawls, re-processing and workers retrying an
+            # expired lease never duplicate a document
+            result = self.supabase.table("documents").upsert(doc_record, on_conflict="url").execute()
+        
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, store)
             print(f"Stored document in Supabase: {doc_data['url']}")
             
         except Exception as e:
@@ -322,14 +415,27 @@ class FlutterFlowScraper:
                 print("Auth test failed:", str(auth_e))
             raise  # Re-raise the original exception
 
+    async def delete_from_supabase(self, url: str) -> None:
+        """Delete a page's stored document, e.g. once it became a near-duplicate of another page"""
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.supabase.table("documents").delete().eq("url", url).execute()
+            )
+        except Exception as e:
+            print(f"Error deleting {url} from Supabase: {str(e)}")
+            raise
+
     async def generate_summary(self, content: str, title: str) -> str:
         """
         Generate a summary of the content using OpenAI
+        
+        Raises after bounded retries rather than returning an empty summary.
         """
         try:
             prompt = f"Title: {title}\n\nContent:\n{content}\n\nPlease provide a concise 2-3 sentence summary of this FlutterFlow documentation page that captures its key points:"
             
-            response = await self.openai_client.chat.completions.create(
+            response = await self.chat_rate.call(
+                self.openai_client.chat.completions.create,
                 model="chatgpt-4o-latest",
                 messages=[
                     {"role": "system", "content": "You are a technical documentation summarizer. Create clear, concise summaries that capture the key points."},
@@ -342,52 +448,241 @@ class FlutterFlowScraper:
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error generating summary: {str(e)}")
-            return ""
+            raise
+
+    async def process_page(self, url: str, markdown: str, page_metadata: Dict) -> Dict:
+        """
+        Clean, summarize, embed and store a page's markdown
+        
+        Shared by crawling and by re-processing archived pages.
+        """
+        title = url.split("/")[-1]
+        # The dedup store may block on SQLite locks or Supabase requests, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, self.boilerplate_filter.clean, markdown, url)
+        metadata = {
+            "title": title,
+            "description": page_metadata.get("description", ""),
+            "last_modified": page_metadata.get("last_modified", "")
+        }
+        
+        # Link near-duplicates to the page already indexed instead of re-embedding them
+        duplicate_of = await loop.run_in_executor(None, self.duplicate_index.add_or_find, url, content)
+        if duplicate_of:
+            print(f"Skipping near-duplicate of {duplicate_of}: {url}")
+            metadata["duplicate_of"] = duplicate_of
+            # A row stored while the page was still distinct would be served as stale content
+            await self.delete_from_supabase(url)
+            return {
+                "url": url,
+                "title": title,
+                "summary": "",
+                "content": content,
+                "metadata": metadata
+            }
+        
+        try:
+            summary = await self.generate_summary(content, title)
+            # Create document data
+            doc_data = {
+                "url": url,
+                "title": title,
+                "summary": summary,
+                "content": content,
+                "metadata": metadata
+            }
+
+            # Generate embedding for the content
+            embedding = await self.generate_embedding(content)
+            
+            # Store in Supabase
+            await self.store_in_supabase(doc_data, embedding)
+        except Exception:
+            # Unstored pages must not stand in for their near-duplicates, which would be skipped
+            try:
+                await loop.run_in_executor(None, self.duplicate_index.remove, url)
+            except Exception as e:
+                print(f"Error removing {url} from the near-duplicate index: {str(e)}")
+            raise
+        
+        return doc_data
+
+    async def reprocess_pages(self, urls: List[str], max_concurrent: int = 8, regenerate_markdown: bool = False, desc: str = "Re-processing pages") -> List[Dict]:
+        """
+        Rebuild summaries, embeddings and Supabase rows for archived pages
+        
+        No browser is used. Pages are processed concurrently, bounded by
+        max_concurrent. Pages missing from this host's archive are skipped.
+        
+        Returns:
+            list: Document data for every page processed successfully
+        """
+        semaphore = asyncio.Semaphore(max_concurrent)
+        loop = asyncio.get_running_loop()
+
+        async def reprocess_url(url: str, pbar: tqdm) -> Optional[Dict]:
+            async with semaphore:
+                try:
+                    record = self.archive.get(url)
+                    if record is None:
+                        print(f"Archived page missing for {url}")
+                        return None
+
+                    markdown = record["markdown"]
+                    if regenerate_markdown:
+                        # Markdown generation is CPU-bound, keep it off the event loop
+                        markdown = await loop.run_in_executor(None, self.generate_markdown, url, record["html"])
+
+                    return await self.process_page(url, markdown, record["metadata"])
+                except Exception as e:
+                    print(f"Error re-processing {url}: {str(e)}")
+                    return None
+                finally:
+                    pbar.update(1)
+
+        with tqdm(total=len(urls), desc=desc) as pbar:
+            results = await asyncio.gather(*[reprocess_url(url, pbar) for url in urls])
+
+        return [r for r in results if r is not None]
+
+    async def reclean_stale_pages(self, results: List[Dict], max_concurrent: int = 8, regenerate_markdown: bool = False) -> List[Dict]:
+        """
+        Re-process pages cleaned before the boilerplate they contain was learned
+        
+        A block only becomes boilerplate once enough pages containing it were
+        seen, so pages cleaned earlier still contain it. Pages skipped as
+        unchanged would otherwise never be cleaned again.
+        
+        Returns:
+            list: results with re-processed pages replaced or added
+        """
+        stale = self.boilerplate_filter.stale_pages()
+        if not stale:
+            return results
+        print(f"Re-cleaning {len(stale)} pages whose boilerplate changed")
+        recleaned = await self.reprocess_pages(stale, max_concurrent=max_concurrent, regenerate_markdown=regenerate_markdown, desc="Re-cleaning pages")
+        
+        by_url = {doc["url"]: doc for doc in recleaned}
+        return [by_url.pop(doc["url"], doc) for doc in results] + list(by_url.values())
+
+    def set_dedup_store(self, store) -> None:
+        """Keep boilerplate and near-duplicate state in another store, e.g. one shared across hosts"""
+        self.dedup_store = store
+        self.boilerplate_filter.store = store
+        self.duplicate_index.store = store
+
+    def generate_markdown(self, url: str, html: str) -> str:
+        """
+        Regenerate markdown from archived HTML with the current markdown generator
+        
+        Uses the same generator and content filter as crawling, without a browser.
+        """
+        result = self.run_config.markdown_generator.generate_markdown(html, base_url=url)
+        return result.raw_markdown
+
+    async def crawl_page(self, url: str, crawler: AsyncWebCrawler) -> Optional[Tuple]:
+        """
+        Crawl a single URL while holding a browser slot
+        
+        Returns:
+            tuple: The crawl result and the page's cache validation, or None if
+            the page is unchanged since it was last stored
+        """
+        async with self.semaphore:  # Control browser concurrency
+            # Skip the browser entirely for pages unchanged since they were last stored
+            validation = await asyncio.get_running_loop().run_in_executor(None, self.check_unchanged, url)
+            if validation and validation.unchanged and self.skip_unchanged:
+                print(f"\nSkipping unchanged {url}")
+                self.unchanged_urls.add(url)
+                return None
+            
+            print(f"\nScraping {url}")
+            result = await crawler.arun(
+                url=url,
+                # Only an unchanged page may come from crawl4ai's cache
+                config=self.run_config if validation and validation.unchanged else self.fresh_run_config
+            )
+        return result, validation
+
+    async def finish_page(self, url: str, result, validation: Optional[CachedResponse]) -> Dict:
+        """
+        Archive a crawled page, then summarize, embed and store it
+        """
+        print(result.markdown)
+        print(f"\nProcessing result for {url}:")
+        # print(f"Result object attributes: {dir(result) if result else 'No result'}")
+        # print(f"Raw result: {result.__dict__ if result else 'No result'}")
+        page_metadata = (result.metadata or {}) if hasattr(result, 'metadata') else {}
+        
+        # Archive the extracted page so it can be re-processed without the browser
+        try:
+            self.archive.put(url, result.cleaned_html, result.markdown, page_metadata)
+        except Exception as e:
+            print(f"Error archiving {url}: {str(e)}")
+        
+        doc_data = await self.process_page(url, result.markdown, page_metadata)
+        if validation:
+            self.http_cache.mark_processed(validation)
+        
+        return doc_data
 
     async def scrape_single_url(self, url: str, crawler: AsyncWebCrawler, pbar: tqdm) -> Dict:
         """
         Scrape a single URL with semaphore control and generate summary
         """
         try:
-            async with self.semaphore:  # Control concurrency
-                print(f"\nScraping {url}")
-                result = await crawler.arun(
-                    url=url,
-                    config=self.run_config
-                )
-                print(result.markdown)
-                print(f"\nProcessing result for {url}:")
-                # print(f"Result object attributes: {dir(result) if result else 'No result'}")
-                # print(f"Raw result: {result.__dict__ if result else 'No result'}")
-                title = url.split("/")[-1]
-                summary = await self.generate_summary(result.markdown, title)
-                content = result.markdown
-                # Create document data
-                doc_data = {
-                    "url": url,
-                    "title": title,
-                    "summary": summary,
-                    "content": content,
-                    "metadata": {
-                        "title": title,
-                        "description": result.metadata.get("description", "") if hasattr(result, 'metadata') else "",
-                        "last_modified": result.metadata.get("last_modified", "") if hasattr(result, 'metadata') else ""
-                    }
-                }
-
-                # Generate embedding for the content
-                embedding = await self.generate_embedding(content)
-                
-                # Store in Supabase
-                await self.store_in_supabase(doc_data, embedding)
-                
-                return doc_data
+            crawled = await self.crawl_page(url, crawler)
+            if crawled is None:
+                return None
+            # Summaries and embeddings are paced by the rate controllers, so the
+            # browser slot is released before they start
+            return await self.finish_page(url, *crawled)
         except Exception as e:
             print(f"Error scraping {url}: {str(e)}")
             return None
         finally:
             pbar.update(1)
 
+    async def crawl_and_queue(self, url: str, crawler: AsyncWebCrawler, pbar: tqdm) -> None:
+        """Crawl a URL and hand the page to a background processing task"""
+        # Wait for room in the processing backlog before crawling more pages
+        await self.pending_pages.acquire()
+        try:
+            crawled = await self.crawl_page(url, crawler)
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            crawled = None
+        
+        if crawled is None:
+            self.pending_pages.release()
+            pbar.update(1)
+            return
+        
+        task = asyncio.create_task(self.process_crawled_page(url, *crawled, pbar))
+        self.processing_tasks.add(task)
+        task.add_done_callback(self.processing_tasks.discard)
+
+    async def process_crawled_page(self, url: str, result, validation: Optional[CachedResponse], pbar: tqdm) -> None:
+        try:
+            doc_data = await self.finish_page(url, result, validation)
+            self.processed_results.append(doc_data)
+        except Exception as e:
+            print(f"Error processing {url}: {str(e)}")
+        finally:
+            self.pending_pages.release()
+            pbar.update(1)
+
+    async def wait_for_processing(self) -> List[Dict]:
+        """
+        Wait for every crawled page to be processed
+        
+        Returns:
+            list: Document data for every page processed successfully
+        """
+        while self.processing_tasks:
+            await asyncio.gather(*list(self.processing_tasks))
+        return self.processed_results
+
     async def init_crawler_with_retry(self) -> AsyncWebCrawler:
         """
         Initialize crawler with retry logic and timeout
@@ -416,11 +711,15 @@ class FlutterFlowScraper:
                             pass
                     raise
     
-    async def scrape_urls_batch(self, urls: List[str], pbar: tqdm) -> List[Dict]:
+    async def scrape_urls_batch(self, urls: List[str], pbar: tqdm) -> None:
         """
-        Scrape a batch of URLs concurrently with improved error handling and retry logic
+        Crawl a batch of URLs and hand each page to background processing
+        
+        Returns once the batch is crawled. Pages are summarized, embedded and
+        stored in background tasks (see wait_for_processing), so the rate
+        controllers, not the browser loop, decide how many API calls run at once.
+        Results are collected in processed_results.
         """
-        results = []
         crawler = None
         try:
             crawler = await self.init_crawler_with_retry()
@@ -431,15 +730,11 @@ class FlutterFlowScraper:
                 sub_batch = urls[i:i + sub_batch_size]
                 
                 # Create tasks for URLs in sub-batch
-                tasks = [self.scrape_single_url(url, crawler, pbar) for url in sub_batch]
+                tasks = [self.crawl_and_queue(url, crawler, pbar) for url in sub_batch]
                 
                 try:
-                    # Execute tasks concurrently and gather results
-                    batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Filter out errors and None results
-                    valid_results = [r for r in batch_results if r is not None and not isinstance(r, Exception)]
-                    results.extend(valid_results)
+                    # Crawl concurrently; processing continues in the background
+                    await asyncio.gather(*tasks, return_exceptions=True)
                     
                     # Longer delay between sub-batches
                     await asyncio.sleep(3)
@@ -456,8 +751,6 @@ class FlutterFlowScraper:
                     await crawler.__aexit__(None, None, None)
                 except Exception as e:
                     print(f"Error closing crawler: {str(e)}")
-        
-        return results
 
     def save_results(self, results: List[Dict], filename: str = "scraped_docs.json"):
         """
@@ -492,16 +785,21 @@ async def main():
         
         print(f"Starting scrape of {len(urls)} pages...")
         
-        # Process URLs in batches
-        results = []
+        # Process URLs in batches; pages processed so far are collected as the crawl goes on
+        results = scraper.processed_results
         with tqdm(total=len(urls), desc="Scraping pages") as pbar:
             for i in range(0, len(urls), scraper.batch_size):
                 batch = urls[i:i + scraper.batch_size]
-                batch_results = await scraper.scrape_urls_batch(batch, pbar)
-                results.extend(batch_results)
+                await scraper.scrape_urls_batch(batch, pbar)
                 
                 # Save progress after each batch
                 scraper.save_progress(results)
+            
+            # Let summaries and embeddings still in flight finish
+            await scraper.wait_for_processing()
+        
+        # Pages processed before their boilerplate was learned are cleaned again
+        results = await scraper.reclean_stale_pages(results)
         
         # Save final results
         scraper.save_results(results)
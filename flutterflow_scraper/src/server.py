@@ -0,0 +1,209 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from agent import FlutterFlowAgent
+
+class QueryRequest(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+
+class ConcurrencyLimiter:
+    """
+    Limit in-flight requests per worker and queue the rest with a timeout
+
+    Requests beyond max_in_flight wait for a slot for up to queue_timeout
+    seconds. Once max_queued requests are already waiting, new ones are
+    rejected straight away instead of piling up.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout: float):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.queued = 0
+
+    async def acquire(self) -> None:
+        if self.semaphore.locked() and self.queued >= self.max_queued:
+            raise HTTPException(status_code=429, detail="Too many queued requests")
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Timed out waiting for a free worker slot")
+        finally:
+            self.queued -= 1
+
+    def release(self) -> None:
+        self.semaphore.release()
+
+# Settings are read per worker process
+MAX_IN_FLIGHT = int(os.getenv("SERVER_MAX_IN_FLIGHT", "8"))
+MAX_QUEUED = int(os.getenv("SERVER_MAX_QUEUED", "32"))
+QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "10"))
+REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "120"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent on this worker's event loop so its connection pools live as long as the worker
+    app.state.agent = FlutterFlowAgent()
+    app.state.limiter = ConcurrencyLimiter(MAX_IN_FLIGHT, MAX_QUEUED, QUEUE_TIMEOUT)
+    # Requests in the same session run one at a time so their history stays ordered
+    app.state.session_locks = weakref.WeakValueDictionary()
+    await app.state.agent.warmup()
+    try:
+        yield
+    finally:
+        await app.state.agent.aclose()
+
+app = FastAPI(title="FlutterFlow Documentation Assistant", lifespan=lifespan)
+
+def resolve_session(request: QueryRequest, header_session_id: Optional[str]) -> tuple[str, bool]:
+    """
+    Return the session to answer in and whether it is a throwaway one
+
+    The session may be given in the body or in the X-Session-ID header, which
+    load balancers can route on. Requests without one get a one-off session,
+    so they never see another client's conversation.
+    """
+    if request.session_id and header_session_id and request.session_id != header_session_id:
+        raise HTTPException(status_code=400, detail="session_id does not match the X-Session-ID header")
+    session_id = request.session_id or header_session_id
+    if session_id:
+        return session_id, False
+    return f"anonymous-{uuid.uuid4()}", True
+
+def get_session_lock(session_id: str) -> asyncio.Lock:
+    lock = app.state.session_locks.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        app.state.session_locks[session_id] = lock
+    return lock
+
+@app.get("/health")
+async def health() -> dict:
+    limiter: ConcurrencyLimiter = app.state.limiter
+    return {"status": "ok", "queued": limiter.queued}
+
+@app.post("/query")
+async def query(request: QueryRequest, x_session_id: Optional[str] = Header(None)) -> dict:
+    """Answer a question and return the full response"""
+    limiter: ConcurrencyLimiter = app.state.limiter
+    session_id, anonymous = resolve_session(request, x_session_id)
+    await limiter.acquire()
+    try:
+        async with get_session_lock(session_id):
+            response = await asyncio.wait_for(
+                app.state.agent.query(request.question, session_id),
+                timeout=REQUEST_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out answering the question")
+    finally:
+        limiter.release()
+        if anonymous:
+            app.state.agent.clear_memory(session_id)
+
+    if "error" in response:
+        raise HTTPException(status_code=500, detail=response["error"])
+    return response
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest, x_session_id: Optional[str] = Header(None)) -> StreamingResponse:
+    """
+    Answer a question, streaming it as newline-delimited JSON events
+
+    Events are {"type": "chunk", "text": ...} while the answer is generated,
+    then {"type": "sources", "sources": [...]}. The stream ends with
+    {"type": "done"}, or with {"type": "error", "error": ...} if answering
+    failed or timed out, so clients can tell a complete answer from a cut-off one.
+    """
+    limiter: ConcurrencyLimiter = app.state.limiter
+    session_id, anonymous = resolve_session(request, x_session_id)
+    # Queue before responding so overload is reported with a status code
+    await limiter.acquire()
+
+    released = False
+
+    def release_slot() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            limiter.release()
+
+    def event(data: dict) -> str:
+        return json.dumps(data) + "\n"
+
+    async def generate() -> AsyncIterator[str]:
+        # The slot is held until the stream finishes or the client disconnects
+        events = app.state.agent.stream_query(request.question, session_id)
+        try:
+            async with get_session_lock(session_id):
+                deadline = time.monotonic() + REQUEST_TIMEOUT
+                while True:
+                    try:
+                        data = await asyncio.wait_for(events.__anext__(), timeout=deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        print(f"Timed out streaming answer for session {session_id}")
+                        yield event({"type": "error", "error": "timeout"})
+                        return
+                    yield event(data)
+            yield event({"type": "done"})
+        except Exception as e:
+            print(f"Error streaming answer: {str(e)}")
+            yield event({"type": "error", "error": str(e)})
+        finally:
+            await events.aclose()
+            release_slot()
+            if anonymous:
+                app.state.agent.clear_memory(session_id)
+
+    # The background task also releases the slot if the stream never started
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(release_slot)
+    )
+
+@app.delete("/sessions/{session_id}")
+async def clear_session(session_id: str) -> dict:
+    """Forget a session's conversation history"""
+    app.state.agent.clear_memory(session_id)
+    return {"session_id": session_id, "cleared": True}
+
+def serve(host: str, port: int) -> None:
+    uvicorn.run("server:app", host=host, port=port, workers=1)
+
+def main():
+    # Each worker is a separate single-worker server on its own port, with its own
+    # agent, limiter and sessions. uvicorn's own workers share one socket, so the
+    # kernel, not a load balancer, would pick the worker for each connection.
+    # Clients must be routed to the same port for every request in a session.
+    host = os.getenv("SERVER_HOST", "0.0.0.0")
+    port = int(os.getenv("SERVER_PORT", "8000"))
+    workers = int(os.getenv("SERVER_WORKERS", "2"))
+    if workers == 1:
+        serve(host, port)
+        return
+    
+    processes = [multiprocessing.Process(target=serve, args=(host, port + i)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,88 @@
 import os
-from typing import Optional
+from typing import List, Optional
 from langchain.tools import Tool
 from langchain_community.vectorstores.supabase import SupabaseVectorStore
 from langchain_openai import ChatOpenAI
 
+DEFAULT_DOCS_URL = "https://docs.flutterflow.io"
+
+def document_url(doc) -> str:
+    """Return the best available source URL for a vector store document"""
+    if not doc.metadata:
+        return DEFAULT_DOCS_URL
+    return doc.metadata.get('url', doc.metadata.get('source', doc.metadata.get('link', doc.metadata.get('href', DEFAULT_DOCS_URL))))
+
+def format_documents(docs) -> str:
+    """Format vector store documents for the LLM context"""
+    formatted_results = []
+    for idx, doc in enumerate(docs, 1):
+        formatted_results.append(
+            f"Documentation {idx}:\n"
+            f"Title: {doc.metadata.get('title', 'Untitled') if doc.metadata else 'Untitled'}\n"
+            f"URL: {document_url(doc)}\n"
+            f"Content: {doc.page_content if hasattr(doc, 'page_content') else doc.content}\n"
+        )
+    return "\n\n".join(formatted_results)
+
+def search_metadata(supabase_client, query: str, match_limit: int = 3) -> tuple[str, str]:
+    """Search document titles and summaries, returning formatted results and a titles context"""
+    result = supabase_client.rpc(
+        'search_doc_metadata',
+        {
+            'query_text': query,
+            'match_limit': match_limit
+        }
+    ).execute()
+    
+    if not result.data:
+        return "", ""
+    
+    # Format results
+    formatted_results = []
+    for idx, doc in enumerate(result.data, 1):
+        formatted_results.append(
+            f"Documentation {idx}:\n"
+            f"Title: {doc.get('title', 'Untitled')}\n"
+            f"URL: {doc.get('url', 'No URL available')}\n"
+            f"Summary: {doc.get('summary', 'No summary available')}\n"
+        )
+    
+    # Extract titles for context
+    titles_context = " ".join([doc.get('title', '') for doc in result.data if doc.get('title')])
+    
+    return "\n\n".join(formatted_results), titles_context
+
+def retrieve_documentation(vector_store: SupabaseVectorStore, supabase_client, query: str, k: int = 3) -> tuple[str, List[str], float]:
+    """
+    Eagerly retrieve documentation for a question without going through the agent
+    
+    Runs the same metadata-then-content search as the search_documentation tool,
+    but also returns the source URLs and the best similarity score so callers
+    can decide whether the retrieved context is good enough to answer from.
+    
+    Returns:
+        tuple: (formatted context, source URLs, best similarity score)
+    """
+    metadata_results, titles_context = search_metadata(supabase_client, query)
+    
+    search_query = query
+    if titles_context:
+        search_query = f"{query} {titles_context}"
+    
+    docs_and_scores = vector_store.similarity_search_with_relevance_scores(search_query, k=k)
+    if not docs_and_scores:
+        return "", [], 0.0
+    
+    docs = [doc for doc, _ in docs_and_scores]
+    best_score = max(score for _, score in docs_and_scores)
+    sources = list(dict.fromkeys(document_url(doc) for doc in docs))
+    
+    context = f"Detailed Information:\n{format_documents(docs)}"
+    if metadata_results:
+        context = f"Overview from Documentation:\n{metadata_results}\n\n{context}"
+    
+    return context, sources, best_score
+
 def create_tools(vector_store: SupabaseVectorStore, supabase_client, openai_api_key: Optional[str] = None) -> list:
     """Create and return a list of tools for the agent"""
     
@@ -20,17 +99,7 @@ def create_tools(vector_store: SupabaseVectorStore, supabase_client, openai_api_
             if not docs:
                 return "No relevant documentation found."
             
-            # Format results
-            formatted_results = []
-            for idx, doc in enumerate(docs, 1):
-                formatted_results.append(
-                    f"Documentation {idx}:\n"
-                    f"Title: {doc.metadata.get('title', 'Untitled') if doc.metadata else 'Untitled'}\n"
-                    f"URL: {doc.metadata.get('url', doc.metadata.get('source', doc.metadata.get('link', doc.metadata.get('href', 'https://docs.flutterflow.io')))) if doc.metadata else 'https://docs.flutterflow.io'}\n"
-                    f"Content: {doc.page_content if hasattr(doc, 'page_content') else doc.content}\n"
-                )
-            
-            return "\n\n".join(formatted_results)
+            return format_documents(docs)
         
         except Exception as e:
             return f"Error searching documentation: {str(e)}"
@@ -40,31 +109,11 @@ def create_tools(vector_store: SupabaseVectorStore, supabase_client, openai_api_
         """Search FlutterFlow documentation by titles and summaries"""
         try:
             # Execute raw SQL query to search titles and summaries
-            result = supabase_client.rpc(
-                'search_doc_metadata',
-                {
-                    'query_text': query,
-                    'match_limit': 3
-                }
-            ).execute()
-            
-            if not result.data:
-                return "No relevant documentation found in titles or summaries."
-            
-            # Format results
-            formatted_results = []
-            for idx, doc in enumerate(result.data, 1):
-                formatted_results.append(
-                    f"Documentation {idx}:\n"
-                    f"Title: {doc.get('title', 'Untitled')}\n"
-                    f"URL: {doc.get('url', 'No URL available')}\n"
-                    f"Summary: {doc.get('summary', 'No summary available')}\n"
-                )
-            
-            # Extract titles for context
-            titles_context = " ".join([doc.get('title', '') for doc in result.data if doc.get('title')])
+            metadata_results, titles_context = search_metadata(supabase_client, query)
+            if not metadata_results:
+                return "No relevant documentation found in titles or summaries.", ""
             
-            return "\n\n".join(formatted_results), titles_context
+            return metadata_results, titles_context
             
         except Exception as e:
             return f"Error searching metadata: {str(e)}"
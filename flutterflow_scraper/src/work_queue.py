@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+# URL states in the crawl queue
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+class SqliteWorkQueue:
+    """
+    Crawl queue in a local SQLite file, shared by worker processes on one host
+
+    Workers claim URLs under a lease that expires unless renewed with
+    heartbeat(). URLs whose lease expired, e.g. because their worker died,
+    can be claimed again. A URL is marked failed after max_attempts claims.
+    """
+
+    def __init__(self, path: Path, lease_seconds: int = 300, max_attempts: int = 3):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Transactions are managed explicitly so claims can take the write lock up front
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        # Heartbeats run on other threads than claims; keep their statements out of each other's transactions
+        self.lock = threading.Lock()
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("""
+            create table if not exists crawl_queue (
+                url text primary key,
+                status text not null default 'pending',
+                lease_owner text,
+                lease_expires real,
+                attempts integer not null default 0,
+                last_error text,
+                updated_at real not null
+            )
+        """)
+        self.conn.execute("create index if not exists crawl_queue_status on crawl_queue (status, lease_expires)")
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        """Add URLs that are not queued yet; returns the number added"""
+        with self.lock:
+            now = time.time()
+            self.conn.execute("begin immediate")
+            try:
+                cursor = self.conn.executemany(
+                    "insert or ignore into crawl_queue (url, updated_at) values (?, ?)",
+                    [(url, now) for url in urls]
+                )
+                self.conn.execute("commit")
+                return cursor.rowcount
+            except Exception:
+                self.conn.execute("rollback")
+                raise
+
+    def claim(self, worker_id: str, limit: int) -> List[str]:
+        """Lease up to limit pending or expired URLs to worker_id"""
+        with self.lock:
+            now = time.time()
+            # begin immediate takes the write lock, so no two workers claim the same URL
+            self.conn.execute("begin immediate")
+            try:
+                # Give up on URLs whose final attempt's lease expired
+                self.conn.execute(
+                    "update crawl_queue set status = ?, lease_owner = null, updated_at = ? "
+                    "where status = ? and lease_expires < ? and attempts >= ?",
+                    (FAILED, now, LEASED, now, self.max_attempts)
+                )
+                urls = [row[0] for row in self.conn.execute(
+                    "select url from crawl_queue "
+                    "where (status = ? or (status = ? and lease_expires < ?)) and attempts < ? "
+                    "order by attempts, url limit ?",
+                    (PENDING, LEASED, now, self.max_attempts, limit)
+                ).fetchall()]
+                self.conn.executemany(
+                    "update crawl_queue set status = ?, lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? where url = ?",
+                    [(LEASED, worker_id, now + self.lease_seconds, now, url) for url in urls]
+                )
+                self.conn.execute("commit")
+                return urls
+            except Exception:
+                self.conn.execute("rollback")
+                raise
+
+    def heartbeat(self, worker_id: str, urls: Iterable[str]) -> int:
+        """Extend worker_id's leases on urls; returns the number still held"""
+        with self.lock:
+            now = time.time()
+            cursor = self.conn.executemany(
+                "update crawl_queue set lease_expires = ?, updated_at = ? "
+                "where url = ? and status = ? and lease_owner = ?",
+                [(now + self.lease_seconds, now, url, LEASED, worker_id) for url in urls]
+            )
+            return cursor.rowcount
+
+    def complete(self, worker_id: str, url: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "update crawl_queue set status = ?, lease_owner = null, last_error = null, updated_at = ? "
+                "where url = ? and lease_owner = ?",
+                (DONE, time.time(), url, worker_id)
+            )
+
+    def fail(self, worker_id: str, url: str, error: str = "") -> None:
+        """Release a URL for another attempt, or mark it failed after max_attempts"""
+        with self.lock:
+            self.conn.execute(
+                "update crawl_queue set status = case when attempts >= ? then ? else ? end, "
+                "lease_owner = null, last_error = ?, updated_at = ? "
+                "where url = ? and lease_owner = ?",
+                (self.max_attempts, FAILED, PENDING, error, time.time(), url, worker_id)
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of URLs in each state"""
+        with self.lock:
+            counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+            counts.update(dict(self.conn.execute("select status, count(*) from crawl_queue group by status").fetchall()))
+            return counts
+
+    def reset(self) -> None:
+        """Queue every URL again, e.g. to start a fresh crawl"""
+        with self.lock:
+            self.conn.execute(
+                "update crawl_queue set status = ?, lease_owner = null, lease_expires = null, "
+                "attempts = 0, last_error = null, updated_at = ?",
+                (PENDING, time.time())
+            )
+
+class SupabaseWorkQueue:
+    """
+    Crawl queue in the Supabase crawl_queue table, shared by workers on any host
+
+    Same interface as SqliteWorkQueue. Claims and lease renewals run in the
+    database (see supabase/crawl_queue.sql) so they use the server's clock and
+    row locks.
+    """
+
+    def __init__(self, supabase_client, lease_seconds: int = 300, max_attempts: int = 3):
+        self.supabase = supabase_client
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        urls = list(urls)
+        added = 0
+        # Batch to keep request bodies small
+        for i in range(0, len(urls), 500):
+            rows = [{"url": url} for url in urls[i:i + 500]]
+            result = self.supabase.table("crawl_queue").upsert(rows, on_conflict="url", ignore_duplicates=True).execute()
+            added += len(result.data or [])
+        return added
+
+    def claim(self, worker_id: str, limit: int) -> List[str]:
+        result = self.supabase.rpc("claim_crawl_urls", {
+            "worker_id": worker_id,
+            "batch_size": limit,
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts
+        }).execute()
+        return [row["url"] for row in result.data or []]
+
+    def heartbeat(self, worker_id: str, urls: Iterable[str]) -> int:
+        result = self.supabase.rpc("heartbeat_crawl_urls", {
+            "worker_id": worker_id,
+            "urls": list(urls),
+            "lease_seconds": self.lease_seconds
+        }).execute()
+        return result.data or 0
+
+    def complete(self, worker_id: str, url: str) -> None:
+        self.supabase.rpc("complete_crawl_url", {"worker_id": worker_id, "url": url}).execute()
+
+    def fail(self, worker_id: str, url: str, error: str = "") -> None:
+        self.supabase.rpc("fail_crawl_url", {
+            "worker_id": worker_id,
+            "url": url,
+            "error": error,
+            "max_attempts": self.max_attempts
+        }).execute()
+
+    def counts(self) -> Dict[str, int]:
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in self.supabase.rpc("crawl_queue_counts", {}).execute().data or []:
+            counts[row["status"]] = row["total"]
+        return counts
+
+    def reset(self) -> None:
+        self.supabase.rpc("reset_crawl_queue", {}).execute()
@@ -0,0 +1,110 @@
+-- Shared crawl queue for sharded crawls across processes and hosts
+-- (python src/crawl_worker.py --queue supabase)
+
+create table if not exists crawl_queue (
+    url text primary key,
+    status text not null default 'pending',  -- pending, leased, done or failed
+    lease_owner text,
+    lease_expires timestamp with time zone,
+    attempts int not null default 0,
+    last_error text,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create index if not exists crawl_queue_status on crawl_queue (status, lease_expires);
+
+-- Lease up to batch_size pending or expired URLs to a worker
+-- skip locked lets concurrent workers claim different rows without waiting
+create or replace function claim_crawl_urls(
+  worker_id text,
+  batch_size int,
+  lease_seconds int,
+  max_attempts int
+)
+returns table (url text)
+language plpgsql
+as $$
+begin
+  -- Give up on URLs whose final attempt's lease expired
+  update crawl_queue q
+  set status = 'failed', lease_owner = null, updated_at = now()
+  where q.status = 'leased' and q.lease_expires < now() and q.attempts >= max_attempts;
+
+  return query
+  update crawl_queue q
+  set status = 'leased',
+      lease_owner = worker_id,
+      lease_expires = now() + make_interval(secs => lease_seconds),
+      attempts = q.attempts + 1,
+      updated_at = now()
+  where q.url in (
+    select c.url
+    from crawl_queue c
+    where (c.status = 'pending' or (c.status = 'leased' and c.lease_expires < now()))
+      and c.attempts < max_attempts
+    order by c.attempts, c.url
+    limit batch_size
+    for update skip locked
+  )
+  returning q.url;
+end;
+$$;
+
+-- Extend a worker's leases; returns the number of URLs it still holds
+create or replace function heartbeat_crawl_urls(
+  worker_id text,
+  urls text[],
+  lease_seconds int
+)
+returns int
+language sql
+as $$
+  with renewed as (
+    update crawl_queue q
+    set lease_expires = now() + make_interval(secs => lease_seconds),
+        updated_at = now()
+    where q.url = any(urls) and q.status = 'leased' and q.lease_owner = worker_id
+    returning 1
+  )
+  select count(*)::int from renewed;
+$$;
+
+create or replace function complete_crawl_url(worker_id text, url text)
+returns void
+language sql
+as $$
+  update crawl_queue q
+  set status = 'done', lease_owner = null, last_error = null, updated_at = now()
+  where q.url = complete_crawl_url.url and q.lease_owner = worker_id;
+$$;
+
+-- Release a URL for another attempt, or mark it failed after max_attempts
+create or replace function fail_crawl_url(worker_id text, url text, error text, max_attempts int)
+returns void
+language sql
+as $$
+  update crawl_queue q
+  set status = case when q.attempts >= max_attempts then 'failed' else 'pending' end,
+      lease_owner = null,
+      last_error = error,
+      updated_at = now()
+  where q.url = fail_crawl_url.url and q.lease_owner = worker_id;
+$$;
+
+create or replace function crawl_queue_counts()
+returns table (status text, total bigint)
+language sql
+as $$
+  select q.status, count(*) from crawl_queue q group by q.status;
+$$;
+
+-- Queue every URL again, e.g. to start a fresh crawl
+create or replace function reset_crawl_queue()
+returns void
+language sql
+as $$
+  update crawl_queue
+  set status = 'pending', lease_owner = null, lease_expires = null,
+      attempts = 0, last_error = null, updated_at = now()
+  where true;
+$$;
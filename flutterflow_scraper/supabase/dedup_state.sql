@@ -0,0 +1,158 @@
+-- Shared boilerplate and near-duplicate state for sharded crawls across hosts
+-- (python src/crawl_worker.py --queue supabase)
+
+-- Blocks each page contains; a block's count is the number of pages containing it
+create table if not exists dedup_page_blocks (
+    page_key text not null,
+    block_key text not null,
+    repeated boolean,  -- removed as repeated when the page was last cleaned; null if not decided by count
+    primary key (page_key, block_key)
+);
+
+alter table dedup_page_blocks add column if not exists repeated boolean;
+
+create index if not exists dedup_page_blocks_block on dedup_page_blocks (block_key);
+
+-- MinHash signature of every indexed page, and its LSH band keys
+create table if not exists dedup_page_signatures (
+    page_key text primary key,
+    signature bigint[] not null
+);
+
+create table if not exists dedup_page_bands (
+    band_key text not null,
+    page_key text not null,
+    primary key (band_key, page_key)
+);
+
+create index if not exists dedup_page_bands_page on dedup_page_bands (page_key);
+
+-- Record the blocks a page contains now, replacing what it contained before.
+-- Returns {"counts": {block_key: pages containing it}, "pages": pages recorded}
+drop function if exists replace_page_blocks(text, text[]);
+
+create or replace function replace_page_blocks(page_key text, block_keys text[])
+returns jsonb
+language plpgsql
+as $$
+begin
+  delete from dedup_page_blocks b where b.page_key = replace_page_blocks.page_key;
+
+  insert into dedup_page_blocks (page_key, block_key)
+  select replace_page_blocks.page_key, k.key
+  from unnest(block_keys) as k(key)
+  on conflict do nothing;
+
+  return jsonb_build_object(
+    'counts', coalesce((
+      select jsonb_object_agg(c.block_key, c.pages)
+      from (
+        select b.block_key, count(*) as pages
+        from dedup_page_blocks b
+        where b.block_key = any(block_keys)
+        group by b.block_key
+      ) c
+    ), '{}'::jsonb),
+    'pages', (select count(distinct b.page_key) from dedup_page_blocks b)
+  );
+end;
+$$;
+
+-- Record which of a page's blocks were removed as repeated when it was cleaned
+create or replace function record_repeated_blocks(page_key text, repeated_keys text[], kept_keys text[])
+returns void
+language sql
+as $$
+  update dedup_page_blocks b
+  set repeated = b.block_key = any(repeated_keys)
+  where b.page_key = record_repeated_blocks.page_key
+    and (b.block_key = any(repeated_keys) or b.block_key = any(kept_keys));
+$$;
+
+-- Pages cleaned under a decision that no longer matches their blocks' counts
+create or replace function stale_dedup_pages(min_pages int)
+returns table (page_key text)
+language sql
+as $$
+  with counts as (
+    select b.block_key, count(*) as pages from dedup_page_blocks b group by b.block_key
+  )
+  select distinct b.page_key
+  from dedup_page_blocks b
+  join counts c on c.block_key = b.block_key
+  where (b.repeated = false and c.pages >= min_pages)
+     or (b.repeated = true and c.pages < min_pages)
+  order by b.page_key;
+$$;
+
+create or replace function dedup_page_count()
+returns bigint
+language sql
+as $$
+  select count(distinct b.page_key) from dedup_page_blocks b;
+$$;
+
+-- Return the page most similar to signature, or index signature under page_key
+-- if none reaches threshold. The page's previous signature is replaced either way.
+-- The advisory lock serializes callers, so two near-identical pages indexed at
+-- the same time cannot both miss each other.
+create or replace function match_or_add_signature(
+  page_key text,
+  signature bigint[],
+  band_keys text[],
+  threshold float
+)
+returns text
+language plpgsql
+as $$
+declare
+  best_key text;
+begin
+  perform pg_advisory_xact_lock(hashtext('dedup_page_signatures'));
+
+  delete from dedup_page_signatures s where s.page_key = match_or_add_signature.page_key;
+  delete from dedup_page_bands b where b.page_key = match_or_add_signature.page_key;
+
+  -- Estimated Jaccard similarity is the fraction of equal signature positions
+  select candidate.page_key into best_key
+  from (
+    select s.page_key,
+      (
+        select count(*)
+        from unnest(s.signature, match_or_add_signature.signature) as pair(stored, wanted)
+        where pair.stored = pair.wanted
+      )::float / array_length(match_or_add_signature.signature, 1) as similarity
+    from dedup_page_signatures s
+    where s.page_key in (
+      select b.page_key from dedup_page_bands b where b.band_key = any(band_keys)
+    )
+  ) candidate
+  where candidate.similarity >= threshold
+  order by candidate.similarity desc
+  limit 1;
+
+  if best_key is null then
+    insert into dedup_page_signatures (page_key, signature)
+    values (match_or_add_signature.page_key, match_or_add_signature.signature);
+
+    insert into dedup_page_bands (band_key, page_key)
+    select k.key, match_or_add_signature.page_key
+    from unnest(band_keys) as k(key)
+    on conflict do nothing;
+  end if;
+
+  return best_key;
+end;
+$$;
+
+-- Stop matching against a page, e.g. because it could not be stored
+create or replace function remove_page_signature(page_key text)
+returns void
+language plpgsql
+as $$
+begin
+  perform pg_advisory_xact_lock(hashtext('dedup_page_signatures'));
+  delete from dedup_page_signatures s where s.page_key = remove_page_signature.page_key;
+  delete from dedup_page_bands b where b.page_key = remove_page_signature.page_key;
+end;
+$$;
@@ -9,10 +9,13 @@ create table documents (
     summary text,
     content text,
     metadata jsonb,
-    embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions
+    embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions; see "python src/embedding_config.py --sql" for smaller storage
     created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
 
+-- One row per page; the scraper upserts documents by URL
+create unique index documents_url_key on documents (url);
+
 -- Create a function to search documents by similarity
 -- Function that accepts a single query_embedding parameter
 create or replace function match_documents (
@@ -0,0 +1,13 @@
+-- Add the unique URL index that document upserts need to existing databases
+--
+-- The scraper upserts documents by URL, so a page crawled twice (e.g. after a
+-- crawl worker's lease expired) still ends up as a single row. New databases
+-- get the index from init.sql.
+--
+-- This DELETES duplicate rows, keeping the newest row (highest id) for each URL.
+
+delete from documents d
+using documents newer
+where d.url = newer.url and d.id < newer.id;
+
+create unique index if not exists documents_url_key on documents (url);